@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+'''
+    Name of Module: data_gen.py
+    Contents:
+        scales
+        make_location_metadata
+        make_cause_metadata
+        make_wide_draws
+        make_long_draws
+        get_location_metadata (db_queries stand-in)
+        get_cause_metadata (db_queries stand-in)
+        get_population (db_queries stand-in)
+
+    Description: Synthetic GBD-shaped data generators for benchmarking
+                 py_utils, plus local stand-ins for the db_queries
+                 metadata and population functions so the location, cause
+                 and population helpers can be timed without a database.
+    Contributors: Kyle Simpson
+'''
+# Import packages
+import numpy as np
+import pandas as pd
+
+# Benchmark scales: (locations, age groups, sexes, years, draws)
+scales = {
+    'small' : (10, 5, 2, 2, 1000),
+    'medium' : (50, 23, 2, 3, 1000),
+    'large' : (200, 23, 2, 5, 1000)
+}
+
+
+def make_location_metadata(n_locs=10, n_super_regions=2, n_regions=4):
+    ''' Builds a location hierarchy shaped like location_set_id=1: Global,
+    super regions, regions, then n_locs countries.
+
+    Arguments:
+    n_locs : int
+             Number of most-detailed (country) locations.
+    n_super_regions : int
+                      Number of super regions.
+    n_regions : int
+                Number of regions. Regions are split evenly across
+                super regions.
+
+    Returns:
+    locs : DataFrame
+           A pandas DataFrame with the columns returned by
+           get_location_metadata.
+    '''
+    sr_ids = np.arange(n_super_regions) + 100
+    r_ids = np.arange(n_regions) + 200
+    r_parents = sr_ids[np.arange(n_regions) % n_super_regions]
+    c_ids = np.arange(n_locs) + 1000
+    c_parents = r_ids[np.arange(n_locs) % n_regions]
+
+    locs = pd.DataFrame({
+        'location_id' : np.concatenate([[1], sr_ids, r_ids, c_ids]),
+        'parent_id' : np.concatenate([[1], np.ones(n_super_regions, dtype=int), r_parents, c_parents]),
+        'level' : np.concatenate([[0], np.full(n_super_regions, 1), np.full(n_regions, 2), np.full(n_locs, 3)])
+    })
+    locs['location_name'] = ['Location {}'.format(l) for l in locs['location_id']]
+    locs.loc[0, 'location_name'] = 'Global'
+    locs['ihme_loc_id'] = ['L{}'.format(l) for l in locs['location_id']]
+    locs.loc[0, 'ihme_loc_id'] = 'G'
+
+    parent = dict(zip(locs['location_id'], locs['parent_id']))
+    level = dict(zip(locs['location_id'], locs['level']))
+    def ancestor_at(loc, lvl):
+        while level[loc] > lvl:
+            loc = parent[loc]
+        return(loc if level[loc] == lvl else np.nan)
+
+    locs['region_id'] = [ancestor_at(l, 2) for l in locs['location_id']]
+    locs['super_region_id'] = [ancestor_at(l, 1) for l in locs['location_id']]
+    names = dict(zip(locs['location_id'], locs['location_name']))
+    locs['region_name'] = locs['region_id'].map(names)
+    locs['super_region_name'] = locs['super_region_id'].map(names)
+    locs['lancet_label'] = locs['location_name']
+    locs['who_label'] = locs['location_name']
+    locs['most_detailed'] = (locs['level'] == 3).astype(int)
+    locs['sort_order'] = np.arange(len(locs)) + 1
+    return(locs)
+
+def make_cause_metadata(n_causes=10):
+    ''' Builds a two-level cause hierarchy shaped like cause_set_id=3:
+    All causes, then n_causes most-detailed causes.
+
+    Arguments:
+    n_causes : int
+               Number of most-detailed causes.
+
+    Returns:
+    causes : DataFrame
+             A pandas DataFrame with the columns returned by
+             get_cause_metadata.
+    '''
+    c_ids = np.arange(n_causes) + 300
+    causes = pd.DataFrame({
+        'cause_id' : np.concatenate([[294], c_ids]),
+        'parent_id' : np.full(n_causes + 1, 294),
+        'level' : np.concatenate([[0], np.ones(n_causes, dtype=int)]),
+        'acause' : ['_all'] + ['cause_{}'.format(c) for c in c_ids],
+        'cause_name' : ['All causes'] + ['Cause {}'.format(c) for c in c_ids],
+        'most_detailed' : np.concatenate([[0], np.ones(n_causes, dtype=int)]),
+        'male' : 1,
+        'female' : 1,
+        'yll_only' : 0,
+        'yld_only' : 0
+    })
+    causes['lancet_label'] = causes['cause_name']
+    causes['sort_order'] = np.arange(len(causes)) + 1
+    return(causes)
+
+def _make_ids(n_locs, n_ages, n_sexes, n_years, n_causes=1):
+    ''' Internal function to build the cartesian product of GBD ids. '''
+    locs = make_location_metadata(n_locs)
+    loc_ids = locs.loc[locs['most_detailed'] == 1, 'location_id'].values
+    cause_ids = make_cause_metadata(n_causes)['cause_id'].values[1:]
+    index = pd.MultiIndex.from_product([
+        loc_ids, 
+        np.arange(n_ages) + 2, 
+        np.arange(n_sexes) + 1, 
+        np.arange(n_years) + 2020 - n_years + 1,
+        cause_ids
+    ], names=['location_id', 'age_group_id', 'sex_id', 'year_id', 'cause_id'])
+    return(index.to_frame(index=False))
+
+def make_wide_draws(n_locs=10, n_ages=5, n_sexes=2, n_years=2, n_draws=1000, n_causes=1, seed=0):
+    ''' Builds a wide draw frame: one row per location/age/sex/year/cause
+    with draw_0 .. draw_{n_draws - 1} columns.
+    '''
+    ids = _make_ids(n_locs, n_ages, n_sexes, n_years, n_causes)
+    draws = np.random.default_rng(seed).gamma(2.0, 1.0, size=(len(ids), n_draws))
+    draws = pd.DataFrame(draws, columns=['draw_{}'.format(d) for d in range(n_draws)])
+    return(pd.concat([ids, draws], axis=1))
+
+def make_long_draws(n_locs=10, n_ages=5, n_sexes=2, n_years=2, n_draws=1000, n_causes=1, seed=0):
+    ''' Builds a long draw frame: one row per location/age/sex/year/cause/
+    draw with draw and draw_val columns.
+    '''
+    ids = _make_ids(n_locs, n_ages, n_sexes, n_years, n_causes)
+    df = ids.loc[ids.index.repeat(n_draws)].reset_index(drop=True)
+    df['draw'] = np.tile(np.arange(n_draws), len(ids))
+    df['draw_val'] = np.random.default_rng(seed).gamma(2.0, 1.0, size=len(df))
+    return(df)
+
+
+#----# db_queries Stand-ins #----# 
+# Built once so the stand-ins cost about as much as a cached query
+_stand_in_metadata = {}
+
+def get_location_metadata(location_set_id=1, **kwargs):
+    ''' Local stand-in for db_queries.get_location_metadata. '''
+    if 'location' not in _stand_in_metadata:
+        _stand_in_metadata['location'] = make_location_metadata(scales['large'][0])
+    return(_stand_in_metadata['location'].copy())
+
+def get_cause_metadata(cause_set_id=3, **kwargs):
+    ''' Local stand-in for db_queries.get_cause_metadata. '''
+    if 'cause' not in _stand_in_metadata:
+        _stand_in_metadata['cause'] = make_cause_metadata()
+    return(_stand_in_metadata['cause'].copy())
+
+def get_population(age_group_id=None, location_id=None, year_id=None, sex_id=None, **kwargs):
+    ''' Local stand-in for db_queries.get_population: a deterministic
+    population for every combination of the supplied ids.
+    '''
+    index = pd.MultiIndex.from_product([location_id, age_group_id, sex_id, year_id], 
+                                       names=['location_id', 'age_group_id', 'sex_id', 'year_id'])
+    pop = index.to_frame(index=False)
+    pop['population'] = 1000.0 + (pop['location_id'] * 7 + pop['age_group_id'] * 3 + pop['sex_id']) % 997
+    pop['run_id'] = 1
+    return(pop)
+#--------------------------------#
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+'''
+    Name of Module: run_benchmarks.py
+    Contents:
+        benchmarks
+        run_benchmarks
+        run_decoration_scaling
+        run_interchange
+
+    Description: Times and memory-profiles the public py_utils data
+                 functions on synthetic GBD-shaped data at several scales.
+                 Location and cause helpers run against the local
+                 db_queries stand-ins in data_gen.
+    Arguments: --scales, --functions, --repeat, --output,
+               --decoration-scaling, --interchange (see --help)
+    Output: A table of best-of-repeat wall time and peak traced memory per
+            function and scale, optionally also written as JSON lines.
+    Usage: python -m surge_utils.py_utils.benchmarks.run_benchmarks --scales small medium
+    Contributors: Kyle Simpson
+'''
+# Import packages
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+import numpy as np
+import pandas as pd
+from surge_utils.py_utils.benchmarks import data_gen
+
+# Fall back to the local stand-ins when db_queries isn't installed
+try:
+    import db_queries
+except ImportError:
+    sys.modules['db_queries'] = data_gen
+from surge_utils.py_utils import utils
+
+
+#----# Benchmark Cases #----# 
+def _id_cols(df):
+    return([c for c in df.columns if not c.startswith('draw')])
+
+def _draw_cols(df):
+    return([c for c in df.columns if c.startswith('draw_')])
+
+def _bench_collapse(data):
+    df = data['wide']
+    return(utils.collapse, (df, 'sum', ['location_id', 'year_id'], _draw_cols(df)), {})
+
+def _bench_rowtotal(data):
+    df = data['wide']
+    return(utils.rowtotal, (df, 'total', _draw_cols(df)), {})
+
+def _bench_row_ops(data):
+    draws = _draw_cols(data['wide'])
+    ops = {'total' : ('sum', draws), 'mean' : ('mean', draws), 'max' : ('max', draws)}
+    return(utils.row_ops, (data['wide'], ops), {})
+
+def _bench_wide_to_long(data):
+    df = data['wide']
+    return(utils.wide_to_long, (df, 'draw_', _id_cols(df), 'draw'), {})
+
+def _bench_long_to_wide(data):
+    df = data['long'].drop(columns='draw_val').rename(columns={'draw' : 'draw_num'})
+    df['draw_'] = data['long']['draw_val'].values
+    return(utils.long_to_wide, (df, 'draw_', _id_cols(data['wide']), 'draw_num'), {})
+
+def _bench_aggregate_long_draws(data):
+    return(utils.aggregate_long_draws, (data['long'], _id_cols(data['wide']), 'draw_val'), {})
+
+def _bench_aggregate_long_draws_sketch(data):
+    return(utils.aggregate_long_draws, (data['long'], _id_cols(data['wide']), 'draw_val'), 
+           {'method' : 'sketch'})
+
+def _bench_aggregate_wide_draws(data):
+    return(utils.aggregate_wide_draws, (data['wide'], 'draw_'), {})
+
+def _bench_draw_arithmetic(data):
+    # Rates against a shuffled, cause-free denominator, as for deaths / population
+    df = data['wide']
+    denom = df[df['cause_id'] == df['cause_id'].iloc[0]].drop(columns='cause_id').sample(frac=1, random_state=0)
+    return(utils.draw_arithmetic, (df, denom, 'divide', [c for c in _id_cols(df) if c != 'cause_id']), {})
+
+def _bench_age_standardize(data):
+    df = data['wide']
+    weights = {a : 1.0 + a for a in df['age_group_id'].unique()}
+    return(utils.age_standardize, (df, _draw_cols(df), weights), {})
+
+def _bench_pop_weighted_collapse(data):
+    df = data['wide']
+    return(utils.pop_weighted_collapse, (df, ['location_id', 'sex_id', 'year_id', 'cause_id'], _draw_cols(df)), {})
+
+def _bench_normalize_frame(data):
+    return(utils.normalize_frame, (data['wide'],), {'draw_col_stub' : 'draw_'})
+
+def _bench_write_draws(data):
+    path = os.path.join(data['tmp_dir'], 'write.parquet')
+    return(utils.write_draws, (data['wide'], path), {'sort_cols' : ['location_id', 'year_id']})
+
+def _bench_read_draws(data):
+    path = os.path.join(data['tmp_dir'], 'read.parquet')
+    if not os.path.exists(path):
+        utils.write_draws(data['wide'], path, sort_cols=['location_id', 'year_id'], row_group_size=1000)
+    loc = data['wide']['location_id'].iloc[0]
+    return(utils.read_draws, (path,), {'id_cols' : _id_cols(data['wide']), 'draw_col_stub' : 'draw_', 
+                                       'location_id' : loc})
+
+def _make_decoration_bench(func_name, key_cols):
+    def bench(data):
+        df = data['wide'][key_cols + _draw_cols(data['wide'])]
+        return(getattr(utils, func_name), (df,), {})
+    return(bench)
+
+benchmarks = {
+    'collapse' : _bench_collapse,
+    'rowtotal' : _bench_rowtotal,
+    'row_ops' : _bench_row_ops,
+    'wide_to_long' : _bench_wide_to_long,
+    'long_to_wide' : _bench_long_to_wide,
+    'aggregate_long_draws' : _bench_aggregate_long_draws,
+    'aggregate_long_draws_sketch' : _bench_aggregate_long_draws_sketch,
+    'aggregate_wide_draws' : _bench_aggregate_wide_draws,
+    'draw_arithmetic' : _bench_draw_arithmetic,
+    'age_standardize' : _bench_age_standardize,
+    'pop_weighted_collapse' : _bench_pop_weighted_collapse,
+    'normalize_frame' : _bench_normalize_frame,
+    'write_draws' : _bench_write_draws,
+    'read_draws' : _bench_read_draws
+}
+for f in ['add_ihme_loc_id', 'add_location_name', 'add_region_id', 'add_region_name', 
+          'add_super_region_id', 'add_super_region_name', 'add_loc_lancet_label', 'add_loc_who_label']:
+    benchmarks[f] = _make_decoration_bench(f, ['location_id'])
+for f in ['add_acause', 'add_cause_name', 'add_cause_lancet_label']:
+    benchmarks[f] = _make_decoration_bench(f, ['cause_id'])
+benchmarks['add_population'] = _make_decoration_bench('add_population', ['location_id', 'age_group_id', 'sex_id', 'year_id'])
+benchmarks['add_cause_id'] = lambda data: (utils.add_cause_id, 
+                                           (utils.add_acause(data['wide'][['cause_id']]).drop(columns='cause_id'),), {})
+#---------------------------#
+
+#----# Runner #----# 
+def _measure(setup, data, repeat):
+    ''' Internal function to time a benchmark case (best of repeat) and
+    measure its peak traced memory in a separate run. Returns the number
+    of input rows (the rows written to disk for cases reading a file), best
+    time in seconds and peak traced bytes.
+    '''
+    times = []
+    for _ in range(repeat):
+        func, args, kwargs = setup(data)
+        gc.collect()
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    func, args, kwargs = setup(data)
+    gc.collect()
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Cases reading from disk take a path, so count the rows written to it
+    if isinstance(args[0], pd.DataFrame):
+        rows = len(args[0])
+    else:
+        rows = len(data['wide'] if isinstance(data, dict) else data)
+    return(rows, min(times), peak)
+
+def run_benchmarks(scale_names=None, functions=None, repeat=3, output=None):
+    ''' Runs the benchmark cases and prints a results table.
+
+    Arguments:
+    scale_names : list-like (optional)
+                  Names of scales in data_gen.scales. Defaults to small.
+    functions : list-like (optional)
+                Names of benchmark cases to run. Defaults to all.
+    repeat : int, default 3
+             Number of timed runs per case; the fastest is reported.
+    output : str (optional)
+             Filepath to append results to as JSON lines.
+
+    Returns:
+    results : list
+              A list of result dictionaries.
+    '''
+    scale_names = scale_names or ['small']
+    functions = functions or list(benchmarks)
+    if any(f not in benchmarks for f in functions):
+        raise ValueError('One or more supplied functions have no benchmark case.')
+    if any(s not in data_gen.scales for s in scale_names):
+        raise ValueError('One or more supplied scales not one of: {}'.format(', '.join(data_gen.scales)))
+
+    results = []
+    print('{:<24} {:<8} {:>10} {:>12} {:>12}'.format('function', 'scale', 'rows', 'seconds', 'peak_mb'))
+    with mock.patch.object(utils, 'get_location_metadata', data_gen.get_location_metadata), \
+         mock.patch.object(utils, 'get_cause_metadata', data_gen.get_cause_metadata), \
+         mock.patch.object(utils, 'get_population', data_gen.get_population):
+        for scale in scale_names:
+            n_locs, n_ages, n_sexes, n_years, n_draws = data_gen.scales[scale]
+            data = {
+                'wide' : data_gen.make_wide_draws(n_locs, n_ages, n_sexes, n_years, n_draws),
+                'long' : data_gen.make_long_draws(n_locs, n_ages, n_sexes, n_years, n_draws),
+                'tmp_dir' : tempfile.mkdtemp()
+            }
+            try:
+                for f in functions:
+                    res = {'function' : f, 'scale' : scale, 'rows' : None}
+                    try:
+                        res['rows'], res['seconds'], peak = _measure(benchmarks[f], data, repeat)
+                        res['peak_mb'] = peak / 1024 ** 2
+                        print('{:<24} {:<8} {:>10} {:>12.4f} {:>12.1f}'.format(f, scale, res['rows'], res['seconds'], res['peak_mb']))
+                    except Exception as e:
+                        res['error'] = repr(e)
+                        print('{:<24} {:<8} {:>10}   ERROR: {}'.format(f, scale, '', res['error']))
+                    results.append(res)
+            finally:
+                shutil.rmtree(data['tmp_dir'])
+
+    if output is not None:
+        with open(output, 'a') as file:
+            for res in results:
+                file.write(json.dumps(res) + '\n')
+
+    return(results)
+
+def run_decoration_scaling(draw_counts=(10, 100, 1000, 5000), repeat=3):
+    ''' Times add_location_name on long draw frames with a growing number of
+    draws per id, against a plain pd.merge of the same metadata. The
+    lookup is resolved once per unique location, so its cost should stay
+    near-flat as the draw count grows.
+
+    Arguments:
+    draw_counts : list-like
+                  Draws per location/age/sex/year to time.
+    repeat : int, default 3
+             Number of timed runs per case; the fastest is reported.
+
+    Returns:
+    results : list
+              A list of result dictionaries.
+    '''
+    n_locs, n_ages, n_sexes, n_years, _ = data_gen.scales['small']
+
+    def merge_location_name(df):
+        locs = data_gen.get_location_metadata()[['location_id', 'location_name']]
+        return(pd.merge(df, locs, on='location_id', how='left'))
+
+    results = []
+    print('{:>8} {:>12} {:>14} {:>14}'.format('draws', 'rows', 'helper_sec', 'merge_sec'))
+    with mock.patch.object(utils, 'get_location_metadata', data_gen.get_location_metadata):
+        for n_draws in draw_counts:
+            df = data_gen.make_long_draws(n_locs, n_ages, n_sexes, n_years, n_draws)
+            helper = lambda data: (utils.add_location_name, (data,), {})
+            merge = lambda data: (merge_location_name, (data,), {})
+            _, helper_sec, _ = _measure(helper, df, repeat)
+            _, merge_sec, _ = _measure(merge, df, repeat)
+            print('{:>8} {:>12} {:>14.4f} {:>14.4f}'.format(n_draws, len(df), helper_sec, merge_sec))
+            results.append({'draws' : n_draws, 'rows' : len(df), 'helper_seconds' : helper_sec, 
+                            'merge_seconds' : merge_sec})
+
+    return(results)
+
+def run_interchange(n_draws=1000, repeat=3):
+    ''' Times handing a wide draw frame between Python and R steps as CSV
+    against Feather and Parquet (the formats read by read_draws in both
+    py_utils and r_utils), and checks which formats bring integer ids and
+    categorical labels back unchanged.
+
+    Arguments:
+    n_draws : int, default 1000
+              Number of draw columns.
+    repeat : int, default 3
+             Number of timed runs per case; the fastest is reported.
+
+    Returns:
+    results : list
+              A list of result dictionaries.
+    '''
+    n_locs, n_ages, n_sexes, n_years, _ = data_gen.scales['small']
+    df = data_gen.make_wide_draws(n_locs, n_ages, n_sexes, n_years, n_draws)
+    ids = df[_id_cols(df)].astype('int32')
+    ids['measure'] = pd.Categorical(np.where(ids['sex_id'] == 1, 'deaths', 'ylds'))
+    df = pd.concat([ids, df[_draw_cols(df)]], axis=1)
+
+    def write_csv(data, path):
+        data.to_csv(path, index=False)
+
+    def read_csv(path):
+        return(pd.read_csv(path))
+
+    cases = [
+        ('csv', 'draws.csv', write_csv, read_csv),
+        ('feather', 'draws.feather', lambda data, path: utils.write_draws(data, path, compression='uncompressed'), 
+         lambda path: utils.read_draws(path, memory_map=True)),
+        ('parquet', 'draws.parquet', lambda data, path: utils.write_draws(data, path), utils.read_draws)
+    ]
+
+    results = []
+    tmp_dir = tempfile.mkdtemp()
+    print('{:>8} {:>12} {:>10} {:>10} {:>10} {:>8}'.format('format', 'rows', 'write_sec', 'read_sec', 'size_mb', 'dtypes'))
+    try:
+        for file_format, name, write, read in cases:
+            path = os.path.join(tmp_dir, name)
+            _, write_sec, _ = _measure(lambda data: (write, (data, path), {}), df, repeat)
+            _, read_sec, _ = _measure(lambda data: (read, (path,), {}), df, repeat)
+            size_mb = os.path.getsize(path) / 1e6
+            dtypes_kept = bool((read(path).dtypes == df.dtypes).all())
+            print('{:>8} {:>12} {:>10.4f} {:>10.4f} {:>10.2f} {:>8}'.format(file_format, len(df), write_sec, read_sec, 
+                                                                          size_mb, str(dtypes_kept)))
+            results.append({'format' : file_format, 'rows' : len(df), 'draws' : n_draws, 'write_seconds' : write_sec, 
+                            'read_seconds' : read_sec, 'size_mb' : size_mb, 'dtypes_kept' : dtypes_kept})
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return(results)
+#------------------#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark py_utils data functions.')
+    parser.add_argument('--scales', nargs='+', default=['small'], help='One or more of: {}'.format(', '.join(data_gen.scales)))
+    parser.add_argument('--functions', nargs='+', default=None, help='Benchmark cases to run (default all).')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case.')
+    parser.add_argument('--output', default=None, help='Filepath to append JSON lines results to.')
+    parser.add_argument('--decoration-scaling', action='store_true', 
+                        help='Time add_location_name against pd.merge as draws per id grow.')
+    parser.add_argument('--interchange', action='store_true', 
+                        help='Time CSV against Feather and Parquet for 1000-draw frames passed between Python and R.')
+    args = parser.parse_args()
+
+    if args.decoration_scaling:
+        run_decoration_scaling(repeat=args.repeat)
+    elif args.interchange:
+        run_interchange(repeat=args.repeat)
+    else:
+        run_benchmarks(args.scales, args.functions, args.repeat, args.output)
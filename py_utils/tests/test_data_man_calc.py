@@ -6,18 +6,39 @@
 ''' 
 # Import packages
 import getpass
+import os
+import shutil
+import tempfile
+import tracemalloc
 import unittest
 import yaml
 import numpy as np
 import pandas as pd
 from surge_utils.py_utils.utils import (
+    age_standardize,
     collapse,
     rowtotal,
+    row_ops,
     wide_to_long,
     long_to_wide,
     aggregate_long_draws,
-    aggregate_wide_draws
+    aggregate_wide_draws,
+    clear_result_cache,
+    draw_arithmetic,
+    instrument,
+    merge_draw_sketches,
+    normalize_frame,
+    pop_weighted_collapse,
+    result_cache,
+    sketch_accuracy_report,
+    sketch_long_draws,
+    summarize_draw_sketches,
+    use_result_cache
 )
+try:
+    import dask.dataframe as dd
+except ImportError:
+    dd = None
 
 class TestCollapse(unittest.TestCase):
     def test_non_dataframe(self):
@@ -50,6 +71,38 @@ class TestCollapse(unittest.TestCase):
                             calc_cols=['total'])['total'][0], 12)
 
 
+class TestLazyCollapse(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'year' : np.repeat([2019, 2020], 10),
+                                'sex' : np.tile([1, 2], 10),
+                                'total' : np.arange(20, dtype=float)})
+        self.df.loc[[3, 4], 'total'] = np.nan
+
+    def test_bad_split_every(self):
+        with self.assertRaises(ValueError):
+            collapse(iter([self.df]), 'sum', group_cols='year', split_every=1)
+
+    def test_chunked_collapse(self):
+        for agg in ['sum', 'mean', 'min', 'max']:
+            chunks = iter([self.df.iloc[i:i + 3] for i in range(0, 20, 3)])
+            test = collapse(chunks, agg, group_cols=['year', 'sex'], calc_cols='total', split_every=2)
+            pd.testing.assert_frame_equal(test, collapse(self.df, agg, group_cols=['year', 'sex'], 
+                                                         calc_cols='total'))
+
+    def test_chunked_missing_cols(self):
+        with self.assertRaises(ValueError):
+            collapse(iter([self.df]), 'sum', group_cols='yr', calc_cols='total')
+
+    @unittest.skipIf(dd is None, 'dask not installed')
+    def test_dask_collapse(self):
+        ddf = dd.from_pandas(self.df, npartitions=4)
+        test = collapse(ddf, 'mean', group_cols='year', calc_cols='total', split_every=2)
+        self.assertTrue(hasattr(test, 'compute'))
+        test = test.compute().sort_values('year').reset_index(drop=True)
+        pd.testing.assert_frame_equal(test, collapse(self.df, 'mean', group_cols='year', 
+                                                     calc_cols='total'))
+
+
 class TestRowtotal(unittest.TestCase):
     def test_non_dataframe(self):
         with self.assertRaises(TypeError):
@@ -69,6 +122,82 @@ class TestRowtotal(unittest.TestCase):
         dt = pd.DataFrame({'year' : np.full([5], 2020), 'total' : [1,2,3,4,5], 'other_tot' : [1,2,3,4,5]})
         self.assertTrue(rowtotal(dt, 'new_total', ['total', 'other_tot'])['new_total'][3], 8)
 
+    def test_rowtotal_missing(self):
+        dt = pd.DataFrame({'a' : [1, np.nan], 'b' : [2, np.nan]})
+        self.assertEqual(rowtotal(dt, 'tot', ['a', 'b'])['tot'][1], 0)
+        self.assertTrue(np.isnan(rowtotal(dt, 'tot', ['a', 'b'], missing='all')['tot'][1]))
+
+    def test_rowtotal_no_mutation(self):
+        dt = pd.DataFrame({'a' : [1, 2], 'b' : [2, 3]})
+        rowtotal(dt, 'tot', ['a', 'b'])
+        self.assertNotIn('tot', dt.columns)
+
+    def test_rowtotal_keeps_integer_dtype(self):
+        dt = pd.DataFrame({'a' : [1, 2], 'b' : [3, 4]})
+        test = rowtotal(dt, 'tot', ['a', 'b'])
+        self.assertEqual(test['tot'].dtype, np.int64)
+        self.assertEqual(list(test['tot']), [4, 6])
+        dt['b'] = dt['b'].astype(float)
+        self.assertEqual(rowtotal(dt, 'tot', ['a', 'b'])['tot'].dtype, np.float64)
+
+
+class TestRowOps(unittest.TestCase):
+    def make_df(self):
+        return(pd.DataFrame({'a' : [1, 2, np.nan], 'b' : [3, np.nan, np.nan], 'c' : [5, 6, 7]}))
+
+    def test_non_dataframe(self):
+        with self.assertRaises(TypeError):
+            row_ops(df=None, ops={'t' : ('sum', 'a')})
+
+    def test_bad_ops(self):
+        with self.assertRaises(TypeError):
+            row_ops(self.make_df(), ops=[])
+        with self.assertRaises(ValueError):
+            row_ops(self.make_df(), ops={'t' : ('median', ['a', 'b'])})
+        with self.assertRaises(ValueError):
+            row_ops(self.make_df(), ops={'t' : ('sum', ['a', 'd'])})
+        with self.assertRaises(ValueError):
+            row_ops(self.make_df(), ops={'a' : ('sum', ['b', 'c'])})
+        with self.assertRaises(ValueError):
+            row_ops(self.make_df(), ops={'t' : ('wsum', ['a', 'b'], [1])})
+        with self.assertRaises(ValueError):
+            row_ops(self.make_df(), ops={'t' : ('sum', [])})
+
+    def test_bad_missing(self):
+        with self.assertRaises(ValueError):
+            row_ops(self.make_df(), ops={'t' : ('sum', 'a')}, missing='drop')
+
+    def test_ops(self):
+        test = row_ops(self.make_df(), {
+            'tot' : ('sum', ['a', 'b']),
+            'avg' : ('mean', ['a', 'b', 'c']),
+            'lo' : ('min', ['a', 'c']),
+            'hi' : ('max', ['b', 'c']),
+            'prod' : ('product', ['a', 'c']),
+            'w' : ('wsum', ['a', 'c'], [2, 0.5])
+        })
+        self.assertEqual(list(test['tot']), [4, 2, 0])
+        self.assertEqual(list(test['avg']), [3, 4, 7])
+        self.assertEqual(list(test['lo']), [1, 2, 7])
+        self.assertEqual(list(test['hi']), [5, 6, 7])
+        self.assertEqual(list(test['prod']), [5, 12, 7])
+        self.assertEqual(list(test['w']), [4.5, 7, 3.5])
+
+    def test_missing_policies(self):
+        df = self.make_df()
+        test = row_ops(df, {'tot' : ('sum', ['a', 'b'])}, missing='all')
+        self.assertTrue(np.isnan(test['tot'][2]))
+        self.assertEqual(test['tot'][1], 2)
+        test = row_ops(df, {'tot' : ('sum', ['a', 'b'])}, missing='propagate')
+        self.assertTrue(np.isnan(test['tot'][1]))
+
+    def test_chunked(self):
+        df = pd.DataFrame(np.random.default_rng(0).random((101, 20)))
+        df.columns = ['draw_{}'.format(c) for c in df.columns]
+        ops = {'tot' : ('sum', list(df.columns)), 'avg' : ('mean', list(df.columns[::2]))}
+        np.testing.assert_allclose(row_ops(df, ops, chunk_size=7)[['tot', 'avg']], 
+                                   row_ops(df, ops)[['tot', 'avg']])
+
 
 class TestWideToLong(unittest.TestCase):
     def test_non_dataframe(self):
@@ -127,6 +256,40 @@ class TestLongToWide(unittest.TestCase):
         self.assertTrue(len(test),  8)
         self.assertTrue(len(test.columns), 4)
 
+    def test_input_untouched(self):
+        df = pd.DataFrame({'famid' : [1, 1, 2, 2], 'age' : [1.0, 2.0, 1.0, 2.0], 'ht' : [1, 2, 3, 4]})
+        long_to_wide(df, stub='ht', i='famid', j='age')
+        self.assertEqual(df['age'].dtype, np.float64)
+
+
+class TestCopyPolicy(unittest.TestCase):
+    def test_inplace(self):
+        df = pd.DataFrame({'location_id' : [6, 7], 'a' : [1, 2], 'b' : [3, 4]})
+        test = rowtotal(df, 'tot', ['a', 'b'], inplace=True)
+        self.assertIs(test, df)
+        self.assertIn('tot', df.columns)
+        normalize_frame(df, inplace=True)
+        self.assertEqual(df['location_id'].dtype, np.int8)
+
+    def test_chained_peak_memory(self):
+        n = 100000
+        draws = ['draw_{}'.format(d) for d in range(20)]
+        df = pd.DataFrame(np.random.default_rng(0).random((n, 20)), columns=draws)
+        df.insert(0, 'location_id', np.arange(n) % 50 + 1)
+        df.insert(1, 'year_id', 2020)
+        df_bytes = df.memory_usage(deep=True).sum()
+
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        df = row_ops(df, {'total' : ('sum', draws), 'mean' : ('mean', draws)}, chunk_size=10000, inplace=True)
+        df = rowtotal(df, 'sub_total', draws[:5], inplace=True)
+        df = normalize_frame(df, inplace=True)
+        peak = tracemalloc.get_traced_memory()[1] - start
+        tracemalloc.stop()
+
+        # The chain should never hold a second copy of the data
+        self.assertLess(peak, 0.75 * df_bytes)
+
 
 class TestAggregateLongDraws(unittest.TestCase):
     def test_non_dataframe(self):
@@ -179,6 +342,69 @@ class TestAggregateLongDraws(unittest.TestCase):
         self.assertEqual(test['mean'][0], 0.5)
         self.assertEqual(test['upper'][0], 0.975)
 
+    def test_na_names_columns(self):
+        df = pd.DataFrame({'year' : [2019, np.nan], 'location_id' : [1, 1], 'val' : [np.nan, 1]})
+        with self.assertRaisesRegex(ValueError, 'year, val'):
+            aggregate_long_draws(df, ['year', 'location_id'], 'val')
+
+    def test_no_validate(self):
+        df = pd.DataFrame({'year' : [2019, 2019, 2019], 'val' : [0, np.nan, 1]})
+        test = aggregate_long_draws(df, 'year', 'val', validate=False)
+        self.assertEqual(test['mean'][0], 0.5)
+
+
+class TestDrawSketches(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.df = pd.DataFrame({'location_id' : np.repeat([1, 2, 3], 1000),
+                                'draw' : np.tile(np.arange(1000), 3),
+                                'val' : rng.normal(0, 10, 3000)})
+
+    def test_bad_method(self):
+        with self.assertRaises(ValueError):
+            aggregate_long_draws(self.df, 'location_id', 'val', method='tdigest')
+
+    def test_bad_relative_error(self):
+        with self.assertRaises(ValueError):
+            sketch_long_draws(self.df, 'location_id', 'val', relative_error=2.0)
+
+    def test_sketch_within_bound(self):
+        exact = aggregate_long_draws(self.df, 'location_id', 'val')
+        test = aggregate_long_draws(self.df, 'location_id', 'val', method='sketch')
+        np.testing.assert_allclose(test['mean'], exact['mean'])
+        for stat in ['lower', 'upper']:
+            np.testing.assert_allclose(test[stat], exact[stat], rtol=0.01)
+
+    def test_methods_match(self):
+        df = pd.DataFrame({'g' : [2, 2, 1, 1], 'val' : [10., 10., 0., 0.]})
+        exact = aggregate_long_draws(df, 'g', 'val')
+        test = aggregate_long_draws(df, 'g', 'val', method='sketch')
+        self.assertEqual(list(exact.columns), ['index', 'g', 'lower', 'mean', 'upper'])
+        self.assertEqual(list(test.columns), list(exact.columns))
+        pd.testing.assert_frame_equal(test[['index', 'g']], exact[['index', 'g']])
+        self.assertEqual(exact['mean'].tolist(), [10, 0])
+        for stat in ['lower', 'mean', 'upper']:
+            np.testing.assert_allclose(test[stat], exact[stat], rtol=0.01)
+
+        exact = aggregate_long_draws(self.df, 'location_id', 'val')
+        test = aggregate_long_draws(self.df, 'location_id', 'val', method='sketch')
+        pd.testing.assert_frame_equal(test[['index', 'location_id']], exact[['index', 'location_id']])
+        np.testing.assert_allclose(test['mean'], exact['mean'])
+        for stat in ['lower', 'upper']:
+            np.testing.assert_allclose(test[stat], exact[stat], rtol=0.01)
+
+    def test_merge_partitions(self):
+        parts = [sketch_long_draws(self.df.iloc[i:i + 700], 'location_id', 'val') 
+                 for i in range(0, 3000, 700)]
+        merged = summarize_draw_sketches(merge_draw_sketches(parts, 'location_id'), 'location_id')
+        whole = summarize_draw_sketches(sketch_long_draws(self.df, 'location_id', 'val'), 'location_id')
+        pd.testing.assert_frame_equal(merged, whole)
+
+    def test_accuracy_report(self):
+        report = sketch_accuracy_report(self.df, 'location_id', 'val', relative_error=0.01)
+        self.assertEqual(report['stat'].tolist(), ['lower', 'upper'])
+        self.assertTrue((report['max_rel_error'] <= 0.01).all())
+
 
 class TestAggregateWideDraws(unittest.TestCase):
     def test_non_dataframe(self):
@@ -209,6 +435,215 @@ class TestAggregateWideDraws(unittest.TestCase):
         self.assertEqual(test['mean'][0], 0.5)
         self.assertEqual(test['upper'][0], 0.975)
 
+    def test_bad_quantiles(self):
+        df = pd.DataFrame({'draw_1' : [0], 'draw_2' : [1]})
+        with self.assertRaises(ValueError):
+            aggregate_wide_draws(df, 'draw_', quantiles=[0.9, 0.1])
+
+    def test_quantiles_chunked(self):
+        rng = np.random.RandomState(1)
+        df = pd.DataFrame(rng.normal(size=(7, 25)), columns=['draw_{}'.format(i) for i in range(25)])
+        df.insert(0, 'location_id', np.arange(7))
+        test = aggregate_wide_draws(df, 'draw_', quantiles=[0.1, 0.9], chunk_size=3)
+        draws = df.filter(like='draw_')
+        np.testing.assert_allclose(test['lower'], draws.quantile(0.1, axis=1))
+        np.testing.assert_allclose(test['upper'], draws.quantile(0.9, axis=1))
+        np.testing.assert_allclose(test['mean'], draws.mean(axis=1))
+
+    def test_na_names_columns(self):
+        df = pd.DataFrame({'location_id' : [1, 2], 'draw_0' : [0, 1], 'draw_1' : [np.nan, 1], 'draw_2' : [0, np.nan]})
+        with self.assertRaisesRegex(ValueError, 'draw_1, draw_2'):
+            aggregate_wide_draws(df, 'draw_', chunk_size=1)
+
+    def test_no_validate(self):
+        df = pd.DataFrame({'location_id' : [1, 2], 'draw_0' : [0, 1], 'draw_1' : [np.nan, 1]})
+        test = aggregate_wide_draws(df, 'draw_', validate=False)
+        self.assertTrue(np.isnan(test['mean'][0]))
+        self.assertEqual(test['mean'][1], 1)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame({'location_id' : np.repeat([6, 7], 4), 'draw' : np.tile(range(4), 2),
+                                'val' : np.arange(8, dtype=float)})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def cached(self):
+        return([f for f in os.listdir(self.dir) if f.endswith('.parquet')])
+
+    def test_bad_args(self):
+        with self.assertRaises(TypeError):
+            use_result_cache(1)
+        with self.assertRaises(ValueError):
+            use_result_cache(self.dir, max_bytes=-1)
+
+    def test_repeat_call_hits(self):
+        with result_cache(self.dir):
+            with instrument() as records:
+                first = aggregate_long_draws(self.df, 'location_id', 'val')
+                second = aggregate_long_draws(self.df, 'location_id', 'val')
+        self.assertEqual([r['cache_hits'] for r in records], [0, 1])
+        pd.testing.assert_frame_equal(first, second)
+        self.assertEqual(len(self.cached()), 1)
+
+    def test_key_includes_frame_and_args(self):
+        with result_cache(self.dir):
+            collapse(self.df, 'sum', 'location_id', 'val')
+            collapse(self.df, 'mean', 'location_id', 'val')
+            df = self.df.copy()
+            df.loc[0, 'val'] = 100
+            test = collapse(df, 'sum', 'location_id', 'val')
+        self.assertEqual(len(self.cached()), 3)
+        self.assertEqual(test['val'].tolist(), [106, 22])
+
+    def test_context_restores(self):
+        with result_cache(self.dir):
+            pass
+        aggregate_wide_draws(self.df, 'val')
+        self.assertEqual(len(self.cached()), 0)
+
+    def test_eviction(self):
+        with result_cache(self.dir, max_bytes=0):
+            collapse(self.df, 'sum', 'location_id', 'val')
+        self.assertEqual(len(self.cached()), 0)
+        with result_cache(self.dir):
+            collapse(self.df, 'sum', 'location_id', 'val')
+            clear_result_cache()
+        self.assertEqual(len(self.cached()), 0)
+
+class TestDrawArithmetic(unittest.TestCase):
+    def setUp(self):
+        self.deaths = pd.DataFrame({'location_id' : [6, 6, 7], 'cause_id' : [294, 295, 294], 
+                                    'draw_0' : [1., 2., 3.], 'draw_1' : [4., 5., 6.]})
+        self.pop = pd.DataFrame({'location_id' : [8, 7, 6], 'draw_1' : [20., 30., 10.], 
+                                 'draw_0' : [2., 3., 1.]})
+
+    def test_non_dataframe(self):
+        with self.assertRaises(TypeError):
+            draw_arithmetic(self.deaths, 1, 'divide', 'location_id')
+
+    def test_bad_op(self):
+        with self.assertRaises(ValueError):
+            draw_arithmetic(self.deaths, self.pop, 'power', 'location_id')
+
+    def test_mismatched_draws(self):
+        with self.assertRaises(ValueError):
+            draw_arithmetic(self.deaths, self.pop.drop(columns='draw_1'), 'divide', 'location_id')
+
+    def test_duplicate_right_keys(self):
+        with self.assertRaises(ValueError):
+            draw_arithmetic(self.deaths, self.deaths, 'divide', 'location_id')
+
+    def test_divide(self):
+        test = draw_arithmetic(self.deaths, self.pop, 'divide', 'location_id')
+        self.assertEqual(list(test.columns), list(self.deaths.columns))
+        self.assertEqual(test['draw_0'].tolist(), [1, 2, 1])
+        self.assertEqual(test['draw_1'].tolist(), [0.4, 0.5, 0.2])
+
+    def test_how(self):
+        pop = self.pop[self.pop['location_id'] != 7].astype({'location_id' : float})
+        test = draw_arithmetic(self.deaths, pop, 'subtract', 'location_id')
+        self.assertEqual(test['cause_id'].tolist(), [294, 295])
+        test = draw_arithmetic(self.deaths, pop, 'subtract', 'location_id', how='left')
+        self.assertEqual(test['draw_0'].tolist()[:2], [0, 1])
+        self.assertTrue(np.isnan(test['draw_0'][2]))
+
+    def test_feeds_aggregate_wide_draws(self):
+        test = aggregate_wide_draws(draw_arithmetic(self.deaths, self.pop, 'multiply', 'location_id'), 'draw_')
+        self.assertEqual(test['mean'].tolist(), [20.5, 26, 94.5])
+
+
+class TestAgeStandardize(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'location_id' : [6, 6, 7], 'age_group_id' : [8, 9, 8], 
+                                'draw_0' : [1., 3., 2.], 'draw_1' : [2., 4., 6.]})
+
+    def test_missing_weights(self):
+        with self.assertRaises(ValueError):
+            age_standardize(self.df, ['draw_0', 'draw_1'], {8 : 1})
+
+    def test_bad_weights_frame(self):
+        with self.assertRaises(ValueError):
+            age_standardize(self.df, ['draw_0', 'draw_1'], pd.DataFrame({'age_group_id' : [8, 9]}))
+
+    def test_proper_use(self):
+        weights = pd.DataFrame({'age_group_id' : [8, 9], 'age_group_weight_value' : [0.25, 0.75]})
+        test = age_standardize(self.df, ['draw_0', 'draw_1'], weights)
+        self.assertEqual(list(test.columns), ['location_id', 'age_group_id', 'draw_0', 'draw_1'])
+        self.assertEqual(test['age_group_id'].tolist(), [27, 27])
+        self.assertEqual(test['draw_0'].tolist(), [2.5, 2])
+        self.assertEqual(test['draw_1'].tolist(), [3.5, 6])
+
+
+class TestPopWeightedCollapse(unittest.TestCase):
+    def test_non_dataframe(self):
+        with self.assertRaises(TypeError):
+            pop_weighted_collapse(1, 'year_id')
+
+    def test_na_values(self):
+        df = pd.DataFrame({'year_id' : [2020, 2020], 'rate' : [1, np.nan], 'population' : [1, 1]})
+        with self.assertRaisesRegex(ValueError, 'rate'):
+            pop_weighted_collapse(df, 'year_id')
+
+    def test_na_population(self):
+        df = pd.DataFrame({'year_id' : [2020, 2020], 'location_id' : [6, 7], 'draw_0' : [1., 2.], 
+                           'population' : [1., np.nan]})
+        with self.assertRaisesRegex(ValueError, r'population.*\(7, 2020\)'):
+            pop_weighted_collapse(df, 'year_id', 'draw_0')
+
+    def test_proper_use(self):
+        df = pd.DataFrame({'year_id' : [2020, 2020, 2021], 'location_id' : [6, 7, 6], 
+                           'rate' : [1., 3., 2.], 'population' : [3., 1., 2.]})
+        test = pop_weighted_collapse(df, 'year_id', 'rate')
+        self.assertEqual(list(test.columns), ['year_id', 'rate', 'population'])
+        self.assertEqual(test['rate'].tolist(), [1.5, 2])
+        self.assertEqual(test['population'].tolist(), [4, 2])
+
+
+class TestNormalizeFrame(unittest.TestCase):
+    def make_df(self):
+        return(pd.DataFrame({
+            'location_id' : [6, 7],
+            'year_id' : [2019.0, 2020.0],
+            'region_id' : [5, np.nan],
+            'location_name' : ['China', 'North Korea'],
+            'draw_0' : [0.1, 0.2]
+        }))
+
+    def test_non_dataframe(self):
+        with self.assertRaises(TypeError):
+            normalize_frame(df=1)
+
+    def test_bad_label_cols(self):
+        with self.assertRaises(ValueError):
+            normalize_frame(self.make_df(), label_cols='cause_name')
+
+    def test_downcast_ids(self):
+        test = normalize_frame(self.make_df())
+        self.assertEqual(test['location_id'].dtype, np.int8)
+        self.assertEqual(test['year_id'].dtype, np.int16)
+        self.assertEqual(test['region_id'].dtype, np.float32)
+        self.assertEqual(test['draw_0'].dtype, np.float64)
+
+    def test_draws_and_labels(self):
+        test = normalize_frame(self.make_df(), draw_col_stub='draw_', categorize=True)
+        self.assertEqual(test['draw_0'].dtype, np.float32)
+        self.assertEqual(test['location_name'].dtype.name, 'category')
+
+    def test_input_untouched(self):
+        df = self.make_df()
+        normalize_frame(df, draw_col_stub='draw_', categorize=True)
+        self.assertEqual(df['location_id'].dtype, np.int64)
+        self.assertEqual(df['draw_0'].dtype, np.float64)
+
+    def test_collapse_opt_in(self):
+        dt = pd.DataFrame({'year_id' : np.full([5], 2020), 'total' : [1,2,3,4,5]})
+        test = collapse(dt, 'sum', group_cols='year_id', calc_cols='total', normalize=True)
+        self.assertEqual(test['year_id'].dtype, np.int16)
+
         
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -4,6 +4,7 @@
     Contributors: Kyle Simpson
 ''' 
 # Import packages
+import numpy as np
 import pandas as pd
 import unittest
 from pandas.util.testing import assert_frame_equal
@@ -11,7 +12,9 @@ from surge_utils.py_utils.utils import (
     add_cause_id,
     add_acause,
     add_cause_name,
-    add_cause_lancet_label
+    add_cause_lancet_label,
+    CauseTree,
+    get_cause_tree
 )
 
 
@@ -140,5 +143,39 @@ class TestAddCauseLancetLabel(unittest.TestCase):
         self.assertEqual(len(test.columns), 2)
 
 
+class TestCauseTree(unittest.TestCase):
+    def setUp(self):
+        self.meta = pd.DataFrame({'cause_id' : [294, 295, 302, 322, 409, 429],
+                                  'parent_id' : [294, 294, 295, 295, 294, 409],
+                                  'most_detailed' : [0, 0, 1, 1, 0, 1],
+                                  'male' : [1, 1, 1, 1, 1, 0],
+                                  'female' : [1, 1, 1, 1, 1, 1],
+                                  'yll_only' : [0, 0, 0, 0, 0, 0],
+                                  'yld_only' : [0, 0, 0, 0, 0, np.nan]})
+        self.tree = CauseTree(self.meta)
+
+    def test_level_and_parent(self):
+        np.testing.assert_array_equal(self.tree.get_level([294, 295, 429]), [0, 1, 2])
+        np.testing.assert_array_equal(self.tree.get_parent([302, 429, 294]), [295, 409, 294])
+
+    def test_flags(self):
+        np.testing.assert_array_equal(self.tree.is_most_detailed([302, 295, 999]), [True, False, False])
+        np.testing.assert_array_equal(self.tree.get_flag([429, 302], 'male'), [False, True])
+        self.assertFalse(self.tree.get_flag([429], 'yld_only')[0])
+        with self.assertRaises(ValueError):
+            self.tree.get_flag([302], 'age_start')
+
+    def test_descendants(self):
+        np.testing.assert_array_equal(self.tree.descendants(295), [295, 302, 322])
+        self.assertTrue(self.tree.is_descendant(429, 294))
+        self.assertFalse(self.tree.is_descendant(429, 295))
+        np.testing.assert_array_equal(self.tree.get_ancestor_at_level([302, 429], 1), [295, 409])
+
+    def test_get_cause_tree(self):
+        tree = get_cause_tree()
+        self.assertIs(tree, get_cause_tree())
+        self.assertEqual(tree.get_level([294])[0], 0)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -4,6 +4,9 @@
     Contributors: Kyle Simpson
 ''' 
 # Import packages
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 import pandas as pd
@@ -16,8 +19,27 @@ from surge_utils.py_utils.utils import (
     add_super_region_id,
     add_super_region_name,
     add_loc_lancet_label,
-    add_loc_who_label
+    add_loc_who_label,
+    add_population,
+    clear_metadata_cache,
+    decorate_partitions,
+    LocationTree,
+    get_core_ref,
+    instrument,
+    location_name_aliases,
+    match_names,
+    normalize_names,
+    pop_weighted_collapse,
+    prefetch_metadata,
+    use_metadata_snapshot,
+    use_population_source,
+    write_metadata_snapshot
 )
+from surge_utils.py_utils import utils
+try:
+    import dask.dataframe as dd
+except ImportError:
+    dd = None
 
 
 class TestAddIHMELocId(unittest.TestCase):
@@ -49,6 +71,39 @@ class TestAddIHMELocId(unittest.TestCase):
         df = add_ihme_loc_id(df)
         self.assertTrue(len(df.columns), 2)
 
+    def test_add_ihme_loc_id_by_messy_location_name(self):
+        df = pd.DataFrame({'location_name' : [' GLOBAL ']})
+        df = add_ihme_loc_id(df)
+        self.assertEqual(df['ihme_loc_id'][0], 'G')
+        self.assertEqual(df['location_name'][0], ' GLOBAL ')
+
+    def test_unmatched_location_name_warns(self):
+        df = pd.DataFrame({'location_name' : ['Narnia']})
+        with self.assertWarnsRegex(UserWarning, 'Narnia'):
+            test = add_ihme_loc_id(df)
+        self.assertTrue(pd.isnull(test['ihme_loc_id'][0]))
+
+
+class TestNormalizeNames(unittest.TestCase):
+    def test_normalize_names(self):
+        test = normalize_names(['Côte d\'Ivoire', '  COTE  D IVOIRE', np.nan])
+        self.assertEqual(test[0], 'cote d ivoire')
+        self.assertEqual(test[1], 'cote d ivoire')
+        self.assertTrue(pd.isnull(test[2]))
+
+
+class TestMatchNames(unittest.TestCase):
+    def test_exact(self):
+        test = match_names(['Global', 'Global'], ['Global', 'Central Asia'])
+        self.assertEqual(list(test), ['Global', 'Global'])
+
+    def test_normalized_and_aliases(self):
+        choices = ['Global', 'United States of America']
+        test = match_names(['global', 'USA', 'Narnia'], choices, aliases=location_name_aliases)
+        self.assertEqual(test[0], 'Global')
+        self.assertEqual(test[1], 'United States of America')
+        self.assertTrue(pd.isnull(test[2]))
+
 
 class TestAddLocationName(unittest.TestCase):
     def test_non_dataframe(self):
@@ -70,6 +125,21 @@ class TestAddLocationName(unittest.TestCase):
         test = add_location_name(df)
         self.assertEqual(test['location_name'][0], 'Global')
     
+    def test_add_location_name_inplace(self):
+        df = pd.DataFrame({'location_id' : [1]})
+        test = add_location_name(df, inplace=True)
+        self.assertIs(test, df)
+        self.assertEqual(df['location_name'][0], 'Global')
+
+    def test_chained_copies(self):
+        df = pd.DataFrame({'location_id' : [1, 32], 'val' : [1.0, 2.0]})
+        expected = df.copy()
+        test = add_super_region_name(add_region_id(add_location_name(add_ihme_loc_id(df))))
+        self.assertIsNot(test, df)
+        self.assertEqual(list(test.columns), ['location_id', 'val', 'ihme_loc_id', 'location_name', 
+                                              'region_id', 'super_region_name'])
+        assert_frame_equal(df, expected)
+
     def test_add_location_name_by_ihme_loc_id(self):
         df = pd.DataFrame({'ihme_loc_id' : ['G']})
         test = add_location_name(df)
@@ -106,6 +176,13 @@ class TestAddRegionId(unittest.TestCase):
         test = add_region_id(df)
         self.assertEqual(test['region_id'][0], 32)
 
+    def test_location_id_matches_ihme_loc_id(self):
+        df = pd.DataFrame({'location_id' : [1, 32], 'ihme_loc_id' : ['G', 'R2']})
+        by_id = add_region_id(df.drop(columns='ihme_loc_id'))
+        by_loc = add_region_id(df.drop(columns='location_id'))
+        self.assertEqual(list(by_id['region_id']), list(by_loc['region_id']))
+        self.assertEqual(by_id['region_id'].dtype, by_loc['region_id'].dtype)
+
     def test_add_region_id_by_location_name(self):
         df = pd.DataFrame({'location_name' : ['Central Asia']})
         test = add_region_id(df)
@@ -332,5 +409,265 @@ class TestAddLocWHOLabel(unittest.TestCase):
         self.assertEqual(len(test.columns), 2)
 
 
+class TestLocationTree(unittest.TestCase):
+    def setUp(self):
+        # Global > super region 31 > region 32 > country 33 > subnational 330
+        self.meta = pd.DataFrame({'location_id' : [1, 31, 32, 33, 34, 330, 4, 5],
+                                  'parent_id' : [1, 1, 31, 32, 32, 33, 1, 4],
+                                  'sort_order' : [1, 2, 3, 4, 6, 5, 7, 8]})
+        self.tree = LocationTree(self.meta)
+
+    def test_bad_meta(self):
+        with self.assertRaises(TypeError):
+            LocationTree(1)
+        with self.assertRaises(ValueError):
+            LocationTree(pd.DataFrame({'location_id' : [1]}))
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            LocationTree(pd.DataFrame({'location_id' : [1, 2], 'parent_id' : [2, 1]}))
+
+    def test_level_and_parent(self):
+        np.testing.assert_array_equal(self.tree.get_level([1, 31, 330]), [0, 1, 4])
+        np.testing.assert_array_equal(self.tree.get_parent([330, 1]), [33, 1])
+        self.assertTrue(np.isnan(self.tree.get_level([999])[0]))
+
+    def test_ancestor_at_level(self):
+        test = self.tree.get_ancestor_at_level([330, 34, 5, 1, 999], 2)
+        np.testing.assert_array_equal(test, [32, 32, 5, np.nan, np.nan])
+        np.testing.assert_array_equal(self.tree.get_ancestor_at_level([330, 5], 1), [31, 4])
+
+    def test_is_descendant(self):
+        self.assertTrue(self.tree.is_descendant(330, 31))
+        self.assertTrue(self.tree.is_descendant(32, 32))
+        self.assertFalse(self.tree.is_descendant(5, 31))
+        np.testing.assert_array_equal(self.tree.is_descendant([330, 5, 999], 32), [True, False, False])
+
+    def test_descendants(self):
+        np.testing.assert_array_equal(self.tree.descendants(32), [32, 33, 330, 34])
+        np.testing.assert_array_equal(self.tree.descendants(4, include_self=False), [5])
+        with self.assertRaises(ValueError):
+            self.tree.descendants(999)
+
+
+class TestDecoratePartitions(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for loc in [1, 32]:
+            pd.DataFrame({'location_id' : [loc], 'year_id' : [2020]}).to_csv(
+                os.path.join(self.dir, 'loc_{}.csv'.format(loc)), index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_bad_decorations(self):
+        with self.assertRaises(ValueError):
+            decorate_partitions(self.dir, ['collapse'])
+        with self.assertRaises(ValueError):
+            decorate_partitions(self.dir, [])
+
+    def test_bad_partitions(self):
+        with self.assertRaises(TypeError):
+            decorate_partitions([1], 'add_location_name')
+        with self.assertRaises(ValueError):
+            decorate_partitions(os.path.join(self.dir, 'missing'), 'add_location_name')
+
+    def test_concat(self):
+        test = decorate_partitions(self.dir, ['add_location_name', 'add_ihme_loc_id'], max_workers=2)
+        self.assertEqual(test['location_name'].tolist(), ['Global', 'Central Asia'])
+        self.assertEqual(test['ihme_loc_id'].tolist(), ['G', 'R2'])
+
+    def test_write_back(self):
+        frame = pd.DataFrame({'location_id' : [1]})
+        paths = decorate_partitions([os.path.join(self.dir, 'loc_32.csv'), frame],
+                                    'add_location_name', output_dir=self.dir,
+                                    max_workers=1, max_in_flight=1)
+        self.assertEqual(paths, [os.path.join(self.dir, 'loc_32.csv'),
+                                 os.path.join(self.dir, 'partition_1.parquet')])
+        test = pd.read_csv(paths[0])
+        self.assertEqual(test['location_name'][0], 'Central Asia')
+
+
+class TestLazyFrames(unittest.TestCase):
+    def test_chunked_location_name(self):
+        chunks = iter([pd.DataFrame({'location_id' : [1]}), pd.DataFrame({'location_id' : [32]})])
+        test = add_location_name(chunks)
+        self.assertEqual(pd.concat(test)['location_name'].tolist(), ['Global', 'Central Asia'])
+
+    @unittest.skipIf(dd is None, 'dask not installed')
+    def test_dask_region_id(self):
+        ddf = dd.from_pandas(pd.DataFrame({'location_id' : [1, 32, 32, 1]}), npartitions=2)
+        test = add_region_id(ddf)
+        self.assertTrue(hasattr(test, 'compute'))
+        self.assertEqual(test.compute()['region_id'].tolist()[1:3], [32, 32])
+
+    @unittest.skipIf(dd is None, 'dask not installed')
+    def test_dask_bad_input(self):
+        ddf = dd.from_pandas(pd.DataFrame({'year' : [2020]}), npartitions=1)
+        with self.assertRaises(ValueError):
+            add_location_name(ddf)
+        with self.assertRaises(ValueError):
+            add_location_name(dd.from_pandas(pd.DataFrame({'location_id' : [1]}), npartitions=1),
+                              inplace=True)
+
+
+class TestMetadataSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        clear_metadata_cache()
+
+    def tearDown(self):
+        use_metadata_snapshot(None)
+        shutil.rmtree(self.dir)
+
+    def test_bad_path(self):
+        with self.assertRaises(ValueError):
+            use_metadata_snapshot(self.dir)
+
+    def test_snapshot_files(self):
+        write_metadata_snapshot(self.dir)
+        self.assertEqual(sorted(os.listdir(self.dir)), 
+                         ['causes.feather', 'locations.feather', 'snapshot.yaml'])
+
+    def test_resolve_from_snapshot(self):
+        write_metadata_snapshot(self.dir)
+        # Edit the snapshot so a lookup can only have come from it
+        path = os.path.join(self.dir, 'locations.feather')
+        locs = pd.read_feather(path)
+        locs.loc[locs['location_id'] == 1, 'location_name'] = 'Snapshot Global'
+        locs.to_feather(path, compression='uncompressed')
+
+        use_metadata_snapshot(self.dir)
+        test = add_location_name(pd.DataFrame({'location_id' : [1]}))
+        self.assertEqual(test['location_name'][0], 'Snapshot Global')
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        clear_metadata_cache()
+
+    def tearDown(self):
+        clear_metadata_cache()
+
+    def test_bad_kinds(self):
+        with self.assertRaises(ValueError):
+            prefetch_metadata(kinds=['age'])
+
+    def test_bad_rounds(self):
+        with self.assertRaises(ValueError):
+            prefetch_metadata(rounds=[(7, 'step4', 1)])
+        with self.assertRaises(ValueError):
+            prefetch_metadata(rounds=[{'round' : 7}])
+
+    def test_prefetch_fills_cache(self):
+        prefetch_metadata(rounds=[{}], kinds=['location'])
+        first = utils._get_location_metadata()
+        second = utils._get_location_metadata(get_core_ref('gbd_round_id'),
+                                              get_core_ref('decomp_step'))
+        self.assertIs(first, second)
+
+    def test_explicit_round(self):
+        df = pd.DataFrame({'location_id' : [1]})
+        test = add_location_name(df, gbd_round_id=get_core_ref('gbd_round_id'),
+                                 decomp_step=get_core_ref('decomp_step'))
+        self.assertEqual(test['location_name'][0], 'Global')
+
+    def test_repeat_decoration_hits_lookup(self):
+        df = pd.DataFrame({'location_id' : [1, 32]})
+        add_location_name(df)
+        with instrument() as records:
+            test = add_location_name(df)
+        hits = [r['cache_hits'] for r in records if r['function'] == 'add_location_name']
+        self.assertEqual(hits, [1])
+        self.assertEqual(list(test['location_name']), ['Global', 'Central Asia'])
+
+    def test_categorical_keys(self):
+        df = pd.DataFrame({'location_id' : pd.Categorical([32, 1, 32])})
+        test = add_region_id(df)
+        expected = add_region_id(df.astype({'location_id' : 'int64'}))
+        self.assertEqual(list(test['region_id']), list(expected['region_id']))
+        test = add_ihme_loc_id(df)
+        self.assertEqual(list(test['ihme_loc_id']), ['R2', 'G', 'R2'])
+
+
+
+class TestAddPopulation(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        def source(location_id, age_group_id, sex_id, year_id, **kwargs):
+            self.calls.append(sorted(location_id))
+            index = pd.MultiIndex.from_product([location_id, age_group_id, sex_id, year_id], names=utils._population_cols)
+            pop = index.to_frame(index=False)
+            pop['population'] = pop['location_id'] * 10.0 + pop['sex_id']
+            return(pop)
+        use_population_source(source)
+
+    def tearDown(self):
+        use_population_source(None)
+
+    def test_non_dataframe(self):
+        with self.assertRaises(TypeError):
+            add_population(1)
+
+    def test_missing_columns(self):
+        with self.assertRaises(ValueError):
+            add_population(pd.DataFrame({'location_id' : [6]}))
+
+    def test_bad_source(self):
+        with self.assertRaises(TypeError):
+            use_population_source(1)
+        with self.assertRaises(ValueError):
+            use_population_source(pd.DataFrame({'location_id' : [6]}))
+
+    def test_proper_use(self):
+        df = pd.DataFrame({'location_id' : [6, 6, 102], 'age_group_id' : 22, 'sex_id' : [1, 2, 1], 
+                           'year_id' : 2020, 'draw_0' : [1, 2, 3]})
+        test = add_population(df)
+        self.assertEqual(test['population'].tolist(), [61, 62, 1021])
+        self.assertNotIn('population', df.columns)
+
+    def test_fetches_only_missing(self):
+        df = pd.DataFrame({'location_id' : [6, 102], 'age_group_id' : 22, 'sex_id' : 1, 'year_id' : 2020})
+        add_population(df)
+        add_population(df.iloc[[0]])
+        add_population(df.assign(location_id=[6., 7.]))
+        self.assertEqual(self.calls, [[6, 102], [7]])
+
+    def test_absent_ids_cached(self):
+        calls = []
+        def source(location_id, **kwargs):
+            calls.append(sorted(location_id))
+            return(pd.DataFrame({'location_id' : [6], 'age_group_id' : 22, 'sex_id' : 1, 
+                                 'year_id' : 2020, 'population' : [5.0]}))
+        use_population_source(source)
+        df = pd.DataFrame({'location_id' : [6, 7], 'age_group_id' : 22, 'sex_id' : 1, 'year_id' : 2020})
+        for _ in range(3):
+            test = add_population(df)
+        self.assertEqual(calls, [[6, 7]])
+        self.assertTrue(np.isnan(test['population'][1]))
+
+    def test_dataframe_source(self):
+        use_population_source(pd.DataFrame({'location_id' : [6], 'age_group_id' : 22, 'sex_id' : 1, 
+                                             'year_id' : 2020, 'population' : [5.0]}))
+        test = add_population(pd.DataFrame({'location_id' : [6, 7], 'age_group_id' : 22, 'sex_id' : 1, 'year_id' : 2020}))
+        self.assertEqual(test['population'][0], 5)
+        self.assertTrue(np.isnan(test['population'][1]))
+
+
+class TestPopWeightedCollapse(unittest.TestCase):
+    def test_missing_location_id(self):
+        df = pd.DataFrame({'sex_id' : [1], 'rate' : [1], 'population' : [1]})
+        with self.assertRaises(ValueError):
+            pop_weighted_collapse(df, 'sex_id', 'rate', location_level=2)
+
+    def test_location_level(self):
+        df = pd.DataFrame({'location_id' : [6, 7, 1], 'sex_id' : 1, 'rate' : [1., 2., 5.], 
+                           'population' : [100., 300., 1000.]})
+        test = pop_weighted_collapse(df, ['location_id', 'sex_id'], 'rate', location_level=2)
+        self.assertEqual(test['location_id'].tolist(), [5])
+        self.assertEqual(test['rate'].tolist(), [1.75])
+        self.assertEqual(test['population'].tolist(), [400])
+
+
 if __name__ == '__main__':
-    unittest.main(verbosity=2)
\ No newline at end of file
+    unittest.main(verbosity=2)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+'''
+    Description: Automated testing of Instrumentation functions
+    Contributors: Kyle Simpson
+''' 
+# Import packages
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from surge_utils.py_utils.utils import (
+    add_metrics_sink,
+    collapse,
+    instrument,
+    jsonl_sink,
+    remove_metrics_sink,
+    write_prometheus_metrics
+)
+
+
+def make_df():
+    return(pd.DataFrame({'year_id' : np.full([5], 2020), 'total' : [1,2,3,4,5]}))
+
+
+class TestMetricsSinks(unittest.TestCase):
+    def test_non_callable_sink(self):
+        with self.assertRaises(TypeError):
+            add_metrics_sink(1)
+
+    def test_remove_unregistered_sink(self):
+        with self.assertRaises(ValueError):
+            remove_metrics_sink(print)
+
+    def test_sink_receives_records(self):
+        records = []
+        add_metrics_sink(records.append)
+        try:
+            collapse(make_df(), 'sum', group_cols='year_id', calc_cols='total')
+        finally:
+            remove_metrics_sink(records.append)
+        collapse(make_df(), 'sum', group_cols='year_id', calc_cols='total')
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['function'], 'collapse')
+
+
+class TestInstrument(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_bad_fmt(self):
+        with self.assertRaises(ValueError):
+            with instrument(fmt='csv'):
+                pass
+
+    def test_records(self):
+        with instrument(track_memory=True) as records:
+            collapse(make_df(), 'sum', group_cols='year_id', calc_cols='total', normalize=True)
+        self.assertEqual([r['function'] for r in records], ['normalize_frame', 'collapse'])
+        self.assertEqual(records[1]['rows_in'], 5)
+        self.assertEqual(records[1]['rows_out'], 1)
+        self.assertIsNotNone(records[1]['peak_memory_delta'])
+        self.assertIsNone(records[0]['peak_memory_delta'])
+
+    def test_error_recorded(self):
+        with instrument() as records:
+            with self.assertRaises(TypeError):
+                collapse(df=None)
+        self.assertIn('error', records[0])
+
+    def test_jsonl(self):
+        path = os.path.join(self.dir, 'metrics.jsonl')
+        with instrument(path=path):
+            collapse(make_df(), 'sum', group_cols='year_id', calc_cols='total')
+        with open(path) as file:
+            lines = [json.loads(l) for l in file]
+        self.assertEqual(lines[0]['function'], 'collapse')
+
+    def test_prometheus(self):
+        path = os.path.join(self.dir, 'metrics.prom')
+        with instrument(path=path, fmt='prometheus'):
+            collapse(make_df(), 'sum', group_cols='year_id', calc_cols='total')
+            collapse(make_df(), 'sum', group_cols='year_id', calc_cols='total')
+        with open(path) as file:
+            text = file.read()
+        self.assertIn('surge_utils_calls_total{function="collapse"} 2', text)
+        self.assertIn('surge_utils_rows_in_total{function="collapse"} 10', text)
+
+    def test_write_prometheus_bad_path(self):
+        with self.assertRaises(TypeError):
+            write_prometheus_metrics([], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
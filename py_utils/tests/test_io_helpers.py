@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+'''
+    Description: Automated testing of I/O Helpers
+    Contributors: Kyle Simpson
+''' 
+# Import packages
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from surge_utils.py_utils.utils import (
+    read_draws,
+    write_draws
+)
+
+
+def make_draws():
+    df = pd.DataFrame({
+        'location_id' : np.repeat([6, 7], 4),
+        'year_id' : np.tile([2019, 2019, 2020, 2020], 2),
+        'sex_id' : np.tile([1, 2], 4),
+        'measure' : 'deaths'
+    })
+    for d in range(3):
+        df['draw_{}'.format(d)] = np.arange(8) + d
+    return(df)
+
+
+class TestWriteDraws(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_non_dataframe(self):
+        with self.assertRaises(TypeError):
+            write_draws(1, os.path.join(self.dir, 'draws.parquet'))
+
+    def test_bad_file_format(self):
+        with self.assertRaises(ValueError):
+            write_draws(make_draws(), os.path.join(self.dir, 'draws.csv'))
+
+    def test_bad_sort_cols(self):
+        with self.assertRaises(ValueError):
+            write_draws(make_draws(), os.path.join(self.dir, 'draws.parquet'), sort_cols='age_group_id')
+
+
+class TestReadDraws(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.df = make_draws()
+        self.paths = [os.path.join(self.dir, 'draws.parquet'), os.path.join(self.dir, 'draws.feather')]
+        for path in self.paths:
+            write_draws(self.df, path, sort_cols=['location_id', 'year_id'], row_group_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_non_string_path(self):
+        with self.assertRaises(TypeError):
+            read_draws(1)
+
+    def test_missing_columns(self):
+        for path in self.paths:
+            with self.assertRaises(ValueError):
+                read_draws(path, id_cols=['age_group_id'])
+
+    def test_round_trip(self):
+        for path in self.paths:
+            test = read_draws(path)
+            self.assertEqual(len(test), 8)
+            self.assertEqual(list(test.columns), list(self.df.columns))
+
+    def test_column_projection(self):
+        for path in self.paths:
+            test = read_draws(path, id_cols=['location_id', 'year_id'], draw_col_stub='draw_')
+            self.assertEqual(list(test.columns), ['location_id', 'year_id', 'draw_0', 'draw_1', 'draw_2'])
+
+    def test_row_filters(self):
+        for path in self.paths:
+            test = read_draws(path, id_cols='location_id', draw_col_stub='draw_', 
+                              location_id=7, year_id=[2020], memory_map=True)
+            self.assertEqual(len(test), 2)
+            self.assertTrue((test['location_id'] == 7).all())
+            self.assertEqual(list(test.columns), ['location_id', 'draw_0', 'draw_1', 'draw_2'])
+
+    def test_preserves_dtypes(self):
+        df = self.df.astype({'location_id' : 'int32', 'measure' : 'category'})
+        for path in self.paths:
+            write_draws(df, path)
+            test = read_draws(path)
+            self.assertEqual(test['location_id'].dtype, np.int32)
+            self.assertEqual(test['year_id'].dtype, np.int64)
+            self.assertIsInstance(test['measure'].dtype, pd.CategoricalDtype)
+            self.assertEqual(list(test['measure'].cat.categories), ['deaths'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
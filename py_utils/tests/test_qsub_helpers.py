@@ -4,11 +4,17 @@
     Contributors: Kyle Simpson
 ''' 
 # Import packages
-import sys
+import io
+import json
+import os
+import tempfile
 import unittest
+from contextlib import redirect_stdout
+from unittest import mock
 from surge_utils.py_utils.utils import (
     code_repo,
-    launch_qsub
+    launch_qsub,
+    read_args_file
 )
 
 # @contextmanager
@@ -94,21 +100,68 @@ class TestQsub(unittest.TestCase):
                                 runtime='01:00:00', script_language='r', script_path='this',
                                 extra_args={'arg1' : 1})
 
-    def test_proper_use_py_script(self):
-        launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
-                    script_path='{}py_utils/tests/test_root_path.py'.format(code_repo))
-        if not hasattr(sys.stdout, "getvalue"):
-            self.fail("need to run in buffered mode")
-        output = sys.stdout.getvalue().strip() # because stdout is an StringIO instance
-        self.assertEqual(output, 'PYTHON job submit using 1 gigs, 1 threads, and 00:02:00 runtime.')
-
-    def test_proper_use_r_script(self):
-        launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
-                    script_language='r', script_path='{}r_utils/tests/test_root_path.R'.format(code_repo))
-        if not hasattr(sys.stdout, "getvalue"):
-            self.fail("need to run in buffered mode")
-        output = sys.stdout.getvalue().strip() # because stdout is an StringIO instance
-        self.assertEqual(output, 'R job submit using 1 gigs, 1 threads, and 00:02:00 runtime.')
+    def test_bad_args_file_type(self):
+        with self.assertRaises(TypeError):
+            launch_qsub(job_name='t', queue='i.q', num_threads=1, num_gigs=1, 
+                                runtime='01:00:00', script_language='r', script_path='this',
+                                args_file=1)
+
+    def test_dry_run_argv(self):
+        argv = launch_qsub(job_name='test', num_threads=1, num_gigs=2, runtime='00:02:00', 
+                           script_path='/path with spaces/script.py', dry_run=True)
+        self.assertEqual(argv[0], 'qsub')
+        self.assertIn('/path with spaces/script.py', argv)
+        self.assertIn('m_mem_free=2G', argv)
+
+    def test_dry_run_list_extra_args(self):
+        argv = launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
+                           script_path='script.py', extra_args=['--loc', 6, 'a b'], dry_run=True)
+        self.assertEqual(argv[-3:], ['--loc', '6', 'a b'])
+
+    def test_args_file(self):
+        args_file = os.path.join(tempfile.mkdtemp(), 'args.json')
+        argv = launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
+                           script_path='script.py', extra_args=['--loc', 6], args_file=args_file, 
+                           dry_run=True)
+        self.assertEqual(argv[-2:], ['script.py', args_file])
+        self.assertFalse(os.path.exists(args_file))
+        with open(args_file, 'w') as file:
+            json.dump(['--loc', '6'], file)
+        self.assertEqual(read_args_file(args_file), ['--loc', '6'])
+
+    @mock.patch('subprocess.call', return_value=0)
+    def test_proper_use_py_script(self, call):
+        script_path = '{}py_utils/tests/test_root_path.py'.format(code_repo)
+        with redirect_stdout(io.StringIO()) as out:
+            launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
+                        script_path=script_path)
+        self.assertEqual(out.getvalue().strip(), 'PYTHON job submit using 1 gigs, 1 threads, and 00:02:00 runtime.')
+        argv = call.call_args[0][0]
+        self.assertEqual(argv[0], 'qsub')
+        self.assertIn(script_path, argv)
+
+    @mock.patch('subprocess.call', return_value=0)
+    def test_proper_use_r_script(self, call):
+        script_path = '{}r_utils/tests/test_root_path.R'.format(code_repo)
+        with redirect_stdout(io.StringIO()) as out:
+            launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
+                        script_language='r', script_path=script_path)
+        self.assertEqual(out.getvalue().strip(), 'R job submit using 1 gigs, 1 threads, and 00:02:00 runtime.')
+        self.assertIn(script_path, call.call_args[0][0])
+
+    @mock.patch('subprocess.call', side_effect=FileNotFoundError)
+    def test_missing_qsub(self, call):
+        with redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(RuntimeError, 'qsub not found'):
+                launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
+                            script_path='script.py')
+
+    @mock.patch('subprocess.call', return_value=1)
+    def test_failed_qsub(self, call):
+        with redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(RuntimeError, 'exited with status 1'):
+                launch_qsub(job_name='test', num_threads=1, num_gigs=1, runtime='00:02:00', 
+                            script_path='script.py')
 
 if __name__ == '__main__':
     unittest.main(verbosity=2, buffer=True)
\ No newline at end of file
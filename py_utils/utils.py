@@ -6,10 +6,21 @@
         set_roots
         collapse (like STATA collapse)
         rowtotal (like STATA rowtotal)
+        row_ops (like STATA egen row functions)
         wide_to_long (reshape)
         long_to_wide (reshape)
         aggregate_long_draws
         aggregate_wide_draws
+        draw_arithmetic
+        sketch_long_draws
+        merge_draw_sketches
+        summarize_draw_sketches
+        sketch_accuracy_report
+        normalize_frame
+        normalize_names
+        match_names
+        LocationTree
+        get_location_tree
         add_ihme_loc_id
         add_location_name
         add_region_id
@@ -18,11 +29,33 @@
         add_super_region_name
         add_loc_lancet_label
         add_loc_who_label
+        CauseTree
+        get_cause_tree
         add_cause_id
         add_acause
         add_cause_name
         add_cause_lancet_label
+        add_population
+        use_population_source
+        age_standardize
+        pop_weighted_collapse
+        prefetch_metadata
+        clear_metadata_cache
+        write_metadata_snapshot
+        use_metadata_snapshot
+        use_result_cache
+        result_cache
+        clear_result_cache
+        read_draws
+        write_draws
+        decorate_partitions
         launch_qsub
+        read_args_file
+        instrument
+        add_metrics_sink
+        remove_metrics_sink
+        jsonl_sink
+        write_prometheus_metrics
 
     Description: Contains useful functions for data formatting, including
                  python versions of common STATA commands.
@@ -32,14 +65,28 @@
     Contributors: Kyle Simpson
 '''
 # Import packages
+import functools
 import getpass
+import hashlib
+import inspect
 import json
+import os
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unicodedata
+import warnings
 import yaml
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from db_queries import (
     get_cause_metadata,
-    get_location_metadata
+    get_location_metadata,
+    get_population
 )
 import numpy as np
 import pandas as pd
@@ -51,8 +98,261 @@ if sys.platform.lower() == 'linux':
 elif 'win' in sys.platform.lower():
     code_repo = 'H:/repos/surge_utils/'
 
+# GBD id and label columns known to normalize_frame
+gbd_id_cols = ['location_id', 'cause_id', 'region_id', 'super_region_id', 
+               'age_group_id', 'sex_id', 'year_id']
+gbd_label_cols = ['ihme_loc_id', 'location_name', 'region_name', 'super_region_name', 
+                  'lancet_label', 'who_label', 'acause', 'cause_name']
+
+# Common alternate names, mapped to their GBD names. Keys are compared after
+# normalize_names, so case, accents and punctuation don't matter.
+location_name_aliases = {
+    'usa' : 'United States of America',
+    'united states' : 'United States of America',
+    'uk' : 'United Kingdom',
+    'russia' : 'Russian Federation',
+    'north korea' : "Democratic People's Republic of Korea",
+    'south korea' : 'Republic of Korea',
+    'iran' : 'Iran (Islamic Republic of)',
+    'vietnam' : 'Viet Nam',
+    'laos' : "Lao People's Democratic Republic",
+    'syria' : 'Syrian Arab Republic',
+    'tanzania' : 'United Republic of Tanzania',
+    'bolivia' : 'Bolivia (Plurinational State of)',
+    'venezuela' : 'Venezuela (Bolivarian Republic of)',
+    'moldova' : 'Republic of Moldova',
+    'taiwan' : 'Taiwan (Province of China)',
+    'ivory coast' : "Côte d'Ivoire"
+}
+cause_name_aliases = {
+    'all cause' : 'All causes',
+    'hiv' : 'HIV/AIDS',
+    'tb' : 'Tuberculosis',
+    'lri' : 'Lower respiratory infections',
+    'copd' : 'Chronic obstructive pulmonary disease'
+}
+_name_aliases = {
+    'location_name' : location_name_aliases,
+    'region_name' : location_name_aliases,
+    'super_region_name' : location_name_aliases,
+    'cause_name' : cause_name_aliases
+}
+
+
+#----# Instrumentation #----# 
+# Registered metrics sinks. Instrumented functions call straight through
+# when this is empty.
+_metrics_sinks = []
+_instrument_state = {'track_memory' : 0}
+_call_state = threading.local()
+
+def _instrumented(func, name=None):
+    ''' Internal decorator which records wall time, rows in/out, peak
+    memory delta and cache hits for each call while a metrics sink is
+    registered.
+    '''
+    name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _metrics_sinks:
+            return(func(*args, **kwargs))
+        return(_call_instrumented(func, name, args, kwargs))
+    return(wrapper)
+
+def _call_instrumented(func, name, args, kwargs):
+    ''' Internal function to make a single instrumented call. '''
+    df = kwargs.get('df', args[0] if args else None)
+    stack = getattr(_call_state, 'stack', None)
+    if stack is None:
+        stack = _call_state.stack = []
+    record = {
+        'function' : name,
+        'start' : time.time(),
+        'seconds' : None,
+        'rows_in' : len(df) if isinstance(df, pd.DataFrame) else None,
+        'rows_out' : None,
+        'peak_memory_delta' : None,
+        'cache_hits' : 0
+    }
+
+    # Memory is only traced for the outermost instrumented call, since
+    # resetting the peak inside a nested call would corrupt the outer one
+    track_memory = _instrument_state['track_memory'] > 0 and len(stack) == 0
+    if track_memory:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        out = func(*args, **kwargs)
+        if isinstance(out, pd.DataFrame):
+            record['rows_out'] = len(out)
+        return(out)
+    except Exception as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        stack.pop()
+        if track_memory:
+            record['peak_memory_delta'] = tracemalloc.get_traced_memory()[1] - mem_start
+            if started_tracing:
+                tracemalloc.stop()
+        for sink in list(_metrics_sinks):
+            sink(record)
+
+def _record_cache_hit():
+    ''' Internal function for caches to report a hit against the
+    innermost instrumented call.
+    '''
+    stack = getattr(_call_state, 'stack', None)
+    if stack:
+        stack[-1]['cache_hits'] += 1
+
+def add_metrics_sink(sink):
+    ''' Convenience function to register a callback which receives a
+    record dictionary (function, start, seconds, rows_in, rows_out,
+    peak_memory_delta, cache_hits) after every call to a public utils
+    function.
+
+    Arguments:
+    sink : callable
+           A function taking a single record dictionary.
+    '''
+    if not callable(sink):
+        raise TypeError('Supplied sink is not callable.')
+    _metrics_sinks.append(sink)
+
+def remove_metrics_sink(sink):
+    ''' Convenience function to unregister a sink added with
+    add_metrics_sink.
+
+    Arguments:
+    sink : callable
+           A previously registered sink.
+    '''
+    if sink not in _metrics_sinks:
+        raise ValueError('Supplied sink is not registered.')
+    _metrics_sinks.remove(sink)
+
+def jsonl_sink(path):
+    ''' Convenience function which returns a sink appending each record
+    to a JSON lines file.
+
+    Arguments:
+    path : str
+           Filepath to the JSON lines file.
+    '''
+    if not isinstance(path, str):
+        raise TypeError('Supplied path is not a string.')
+
+    def sink(record):
+        with open(path, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+    return(sink)
+
+def write_prometheus_metrics(records, path):
+    ''' Convenience function to write records to a Prometheus text file,
+    aggregated per function (e.g. for a node_exporter textfile collector).
+    The file is replaced atomically.
+
+    Arguments:
+    records : list-like
+              Record dictionaries, as passed to metrics sinks.
+    path : str
+           Filepath to the .prom file.
+    '''
+    if not isinstance(path, str):
+        raise TypeError('Supplied path is not a string.')
+
+    metrics = [
+        ('calls_total', 'counter', 'Number of calls.', lambda r: 1),
+        ('errors_total', 'counter', 'Number of calls which raised.', lambda r: int('error' in r)),
+        ('seconds_total', 'counter', 'Wall time spent in calls.', lambda r: r['seconds']),
+        ('rows_in_total', 'counter', 'Rows passed in.', lambda r: r['rows_in'] or 0),
+        ('rows_out_total', 'counter', 'Rows returned.', lambda r: r['rows_out'] or 0),
+        ('cache_hits_total', 'counter', 'Cache hits.', lambda r: r['cache_hits']),
+    ]
+    totals = {}
+    peaks = {}
+    for r in records:
+        f = r['function']
+        totals.setdefault(f, [0] * len(metrics))
+        for pos, m in enumerate(metrics):
+            totals[f][pos] += m[3](r)
+        if r['peak_memory_delta'] is not None:
+            peaks[f] = max(peaks.get(f, 0), r['peak_memory_delta'])
+
+    lines = []
+    for pos, (m, mtype, help_text, _) in enumerate(metrics):
+        lines += ['# HELP surge_utils_{} {}'.format(m, help_text), '# TYPE surge_utils_{} {}'.format(m, mtype)]
+        lines += ['surge_utils_{}{{function="{}"}} {}'.format(m, f, t[pos]) for f, t in sorted(totals.items())]
+    lines += ['# HELP surge_utils_peak_memory_delta_bytes Largest traced peak memory delta.', 
+              '# TYPE surge_utils_peak_memory_delta_bytes gauge']
+    lines += ['surge_utils_peak_memory_delta_bytes{{function="{}"}} {}'.format(f, p) for f, p in sorted(peaks.items())]
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+@contextmanager
+def instrument(path=None, fmt='jsonl', track_memory=False, sink=None):
+    ''' Context manager which records every public utils call made inside
+    it. Yields the list of records collected.
+
+    Arguments:
+    path : str (optional)
+           Filepath to write records to.
+    fmt : str, default 'jsonl'
+          One of jsonl (records appended as they happen) or prometheus
+          (per-function totals written on exit).
+    track_memory : bool, default False
+                   If true, traces peak memory with tracemalloc. This slows
+                   calls down noticeably.
+    sink : callable (optional)
+           An extra callback which receives each record.
+    '''
+    if fmt not in ['jsonl', 'prometheus']:
+        raise ValueError('Supplied fmt not one of: jsonl, prometheus.')
+    if sink is not None and not callable(sink):
+        raise TypeError('Supplied sink is not callable.')
+
+    records = []
+    sinks = [records.append]
+    if path is not None and fmt == 'jsonl':
+        sinks.append(jsonl_sink(path))
+    if sink is not None:
+        sinks.append(sink)
+
+    for s in sinks:
+        add_metrics_sink(s)
+    if track_memory:
+        _instrument_state['track_memory'] += 1
+    try:
+        yield records
+    finally:
+        for s in sinks:
+            remove_metrics_sink(s)
+        if track_memory:
+            _instrument_state['track_memory'] -= 1
+        if path is not None and fmt == 'prometheus':
+            write_prometheus_metrics(records, path)
+
+# Time database calls alongside the helpers which make them
+get_cause_metadata = _instrumented(get_cause_metadata, 'db_queries.get_cause_metadata')
+get_location_metadata = _instrumented(get_location_metadata, 'db_queries.get_location_metadata')
+get_population = _instrumented(get_population, 'db_queries.get_population')
+#---------------------------#
+
 
 #----# Root and Path Helpers #----# 
+@_instrumented
 def get_core_ref(param_name, sub_key=None):
     ''' Convenience function to pull static reference from refs.yaml.
 
@@ -74,6 +374,7 @@ def get_core_ref(param_name, sub_key=None):
     else:
         return(refs[param_name][sub_key])
 
+@_instrumented
 def set_roots():
     ''' Convenience function to create root filepaths.
 
@@ -104,14 +405,787 @@ def set_roots():
 roots = set_roots()
 #----------------------------------#
 
+#----# GBD Metadata and Hierarchies #----# 
+# Location and cause metadata and trees, keyed by (kind, gbd_round_id, decomp_step,
+# release_id). Cached frames are shared, so helpers must not modify them.
+_metadata_cache = {}
+_tree_cache = {}
+_metadata_lock = threading.Lock()
+# Metadata snapshot directory (see write_metadata_snapshot) consulted before
+# the database; the SURGE_METADATA_SNAPSHOT environment variable sets it for
+# both py_utils and r_utils.
+_metadata_snapshot = {'path' : os.environ.get('SURGE_METADATA_SNAPSHOT') or None}
+_snapshot_files = {'location' : 'locations.feather', 'cause' : 'causes.feather'}
+
+def _metadata_key(kind, gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Internal function to build a metadata cache key, filling in the
+    refs.yaml round and decomp step unless a release_id is supplied.
+    '''
+    if kind not in ['location', 'cause']:
+        raise ValueError('Supplied kind not one of: location, cause.')
+    if release_id is not None:
+        return((kind, None, None, release_id))
+    if gbd_round_id is None:
+        gbd_round_id = get_core_ref('gbd_round_id')
+    if decomp_step is None:
+        decomp_step = get_core_ref('decomp_step')
+    return((kind, gbd_round_id, decomp_step, None))
+
+def _get_metadata(kind, gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Internal function to pull location (location_set_id=1) or cause
+    (cause_set_id=3) metadata for a round/decomp step or release, fetching
+    each at most once per session.
+    '''
+    key = _metadata_key(kind, gbd_round_id, decomp_step, release_id)
+    with _metadata_lock:
+        if key in _metadata_cache:
+            _record_cache_hit()
+            return(_metadata_cache[key])
+
+    _, gbd_round_id, decomp_step, release_id = key
+    if release_id is not None:
+        round_args = {'release_id' : release_id}
+    else:
+        round_args = {'gbd_round_id' : gbd_round_id, 'decomp_step' : decomp_step}
+    meta = _read_snapshot(key)
+    if meta is None and kind == 'location':
+        meta = get_location_metadata(location_set_id=1, **round_args)
+    elif meta is None:
+        meta = get_cause_metadata(cause_set_id=3, **round_args)
+
+    with _metadata_lock:
+        return(_metadata_cache.setdefault(key, meta))
+
+def _read_snapshot(key):
+    ''' Internal function to read metadata for a cache key from the active
+    snapshot, memory-mapped. Returns None if there is no snapshot or it was
+    taken for a different round/decomp step or release.
+    '''
+    path = _metadata_snapshot['path']
+    if path is None:
+        return(None)
+    with open(os.path.join(path, 'snapshot.yaml')) as f:
+        info = yaml.safe_load(f)
+    kind, gbd_round_id, decomp_step, release_id = key
+    if (info.get('gbd_round_id'), info.get('decomp_step'), info.get('release_id')) != (gbd_round_id, decomp_step, release_id):
+        return(None)
+    import pyarrow.feather as feather
+    return(feather.read_table(os.path.join(path, _snapshot_files[kind]), memory_map=True).to_pandas())
+
+@_instrumented
+def write_metadata_snapshot(path, gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Convenience function to write location and cause metadata for one
+    round to a snapshot directory (locations.feather, causes.feather and
+    snapshot.yaml) that both py_utils and r_utils can read, so a mixed
+    pipeline queries the database once and both languages use identical
+    metadata.
+
+    Arguments:
+    path : str
+           Directory to write the snapshot to. Created if needed.
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    '''
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    if not isinstance(path, str):
+        raise TypeError('Supplied path is not a string.')
+    os.makedirs(path, exist_ok=True)
+
+    for kind in ['location', 'cause']:
+        key = _metadata_key(kind, gbd_round_id, decomp_step, release_id)
+        table = pa.Table.from_pandas(_get_metadata(*key), preserve_index=False)
+        # Uncompressed, so readers can memory-map it
+        feather.write_feather(table, os.path.join(path, _snapshot_files[kind]), 
+                              compression='uncompressed')
+
+    _, gbd_round_id, decomp_step, release_id = key
+    info = {'gbd_round_id' : gbd_round_id, 'decomp_step' : decomp_step, 'release_id' : release_id,
+            'created' : datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'user' : getpass.getuser()}
+    with open(os.path.join(path, 'snapshot.yaml'), 'w') as f:
+        yaml.safe_dump(info, f, default_flow_style=False)
+
+def use_metadata_snapshot(path):
+    ''' Convenience function to resolve metadata from a snapshot directory
+    (see write_metadata_snapshot) before the database, for the round it was
+    taken for. Pass None to stop using a snapshot.
+
+    Arguments:
+    path : str
+           Snapshot directory, or None.
+    '''
+    if path is not None and not os.path.isfile(os.path.join(path, 'snapshot.yaml')):
+        raise ValueError('Supplied path {} does not contain a metadata snapshot.'.format(path))
+    with _metadata_lock:
+        _metadata_snapshot['path'] = path
+        _metadata_cache.clear()
+        _tree_cache.clear()
+        _lookup_cache.clear()
+
+def _get_location_metadata(gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Internal function to pull cached location metadata. '''
+    return(_get_metadata('location', gbd_round_id, decomp_step, release_id))
+
+def _get_cause_metadata(gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Internal function to pull cached cause metadata. '''
+    return(_get_metadata('cause', gbd_round_id, decomp_step, release_id))
+
+@_instrumented
+def prefetch_metadata(rounds=None, kinds=('location', 'cause'), max_workers=None):
+    ''' Convenience function to fetch location and cause metadata for
+    several rounds concurrently, so later helper calls are served from the
+    session cache.
+
+    Arguments:
+    rounds : list-like (optional)
+             Rounds to fetch, each a dictionary with any of gbd_round_id,
+             decomp_step and release_id, or a (gbd_round_id, decomp_step)
+             tuple. Defaults to the refs.yaml round.
+    kinds : list-like, default ('location', 'cause')
+            Which hierarchies to fetch.
+    max_workers : int (optional)
+                  Maximum number of concurrent fetches.
+    '''
+    if rounds is None:
+        rounds = [{}]
+    if isinstance(kinds, str):
+        kinds = [kinds]
+    if any(k not in ['location', 'cause'] for k in kinds):
+        raise ValueError('Supplied kinds not one of: location, cause.')
+
+    jobs = []
+    for r in rounds:
+        if isinstance(r, tuple):
+            if len(r) != 2:
+                raise ValueError('Supplied round tuples must be (gbd_round_id, decomp_step).')
+            r = {'gbd_round_id' : r[0], 'decomp_step' : r[1]}
+        if not isinstance(r, dict) or any(k not in ['gbd_round_id', 'decomp_step', 'release_id'] for k in r):
+            raise ValueError('Supplied rounds must be dictionaries of gbd_round_id, decomp_step, release_id.')
+        jobs += [(k, r) for k in kinds]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_get_metadata, k, **r) for k, r in jobs]
+        for f in futures:
+            f.result()
+
+def clear_metadata_cache():
+    ''' Convenience function to empty the session metadata and population
+    caches.
+    '''
+    with _metadata_lock:
+        _metadata_cache.clear()
+        _tree_cache.clear()
+        _lookup_cache.clear()
+        _population_cache.clear()
+
+class _HierarchyTree(object):
+    ''' Internal base class for compact in-memory hierarchy indexes, built
+    from GBD metadata (id_col and parent_id, ordered by sort_order if
+    present). Nodes are held in NumPy arrays of parent positions, levels,
+    Euler tour intervals and ancestors by level, so queries over many ids
+    are vectorized. A node counts as its own ancestor and descendant.
+    Metadata flag columns in flag_cols are kept as boolean arrays.
+    '''
+    id_col = None
+    flag_cols = ['most_detailed']
+
+    def __init__(self, meta):
+        if not isinstance(meta, pd.DataFrame):
+            raise TypeError('Supplied meta is not a pandas DataFrame.')
+        if any(c not in meta.columns for c in [self.id_col, 'parent_id']):
+            raise ValueError('Supplied meta does not contain columns for {} and parent_id.'.format(self.id_col))
+        meta = meta.drop_duplicates(self.id_col)
+        if 'sort_order' in meta.columns:
+            meta = meta.sort_values('sort_order', kind='stable')
+
+        self.ids = meta[self.id_col].to_numpy(dtype=np.int64)
+        n = len(self.ids)
+        self._sorter = np.argsort(self.ids, kind='stable')
+        self._sorted_ids = self.ids[self._sorter]
+
+        # Parent positions; roots (and orphans) point at themselves
+        nodes = np.arange(n)
+        parent = self._positions(meta['parent_id'].to_numpy())
+        self.parent = np.where(parent < 0, nodes, parent)
+
+        # Levels, by walking every node up to its root together
+        self.level = np.zeros(n, dtype=np.int64)
+        cur = nodes.copy()
+        for _ in range(n + 1):
+            moving = self.parent[cur] != cur
+            if not moving.any():
+                break
+            self.level[moving] += 1
+            cur[moving] = self.parent[cur[moving]]
+        else:
+            raise ValueError('Supplied meta contains a cycle in parent_id.')
+        self.max_level = int(self.level.max()) if n > 0 else -1
+        by_level = [np.flatnonzero(self.level == l) for l in range(self.max_level + 1)]
+
+        # Subtree sizes, bottom up
+        size = np.ones(n, dtype=np.int64)
+        for lvl_nodes in reversed(by_level[1:]):
+            np.add.at(size, self.parent[lvl_nodes], size[lvl_nodes])
+
+        # Euler tour intervals: descendants of i are the nodes with
+        # tin[i] <= tin < tout[i]. Children are laid out in metadata order.
+        self.tin = np.zeros(n, dtype=np.int64)
+        self.ancestors = np.full((n, self.max_level + 1), -1, dtype=np.int64)
+        for l, lvl_nodes in enumerate(by_level):
+            lvl_nodes = lvl_nodes[np.argsort(self.parent[lvl_nodes], kind='stable')]
+            grp = self.parent[lvl_nodes]
+            offset = np.cumsum(size[lvl_nodes]) - size[lvl_nodes]
+            start = np.ones(len(lvl_nodes), dtype=bool)
+            start[1:] = grp[1:] != grp[:-1]
+            offset -= np.maximum.accumulate(np.where(start, offset, 0))
+            if l == 0:
+                # Roots share the tour, one after another
+                self.tin[lvl_nodes] = np.cumsum(size[lvl_nodes]) - size[lvl_nodes]
+            else:
+                self.tin[lvl_nodes] = self.tin[grp] + 1 + offset
+                self.ancestors[lvl_nodes, :l] = self.ancestors[grp, :l]
+            self.ancestors[lvl_nodes, l] = lvl_nodes
+        self.tout = self.tin + size
+        self._tour = np.empty(n, dtype=np.int64)
+        self._tour[self.tin] = nodes
+
+        # Metadata flags, in node order
+        self.flags = {}
+        for c in self.flag_cols:
+            if c in meta.columns:
+                self.flags[c] = meta[c].fillna(0).to_numpy().astype(bool)
+
+    def __len__(self):
+        return(len(self.ids))
+
+    def _positions(self, ids):
+        ''' Internal method mapping ids to node positions (-1 if unknown). '''
+        ids = np.asarray(ids)
+        if len(self._sorted_ids) == 0:
+            return(np.full(ids.shape, -1, dtype=np.int64))
+        idx = np.searchsorted(self._sorted_ids, ids)
+        idx = np.minimum(idx, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[idx] == ids
+        return(np.where(found, self._sorter[idx], -1))
+
+    def _to_ids(self, pos):
+        ''' Internal method mapping node positions back to ids, giving a
+        float array with NaN wherever a position is -1.
+        '''
+        pos = np.asarray(pos)
+        out = self.ids[np.maximum(pos, 0)]
+        if (pos < 0).any():
+            out = np.where(pos < 0, np.nan, out)
+        return(out)
+
+    def get_parent(self, ids):
+        ''' Returns the parent id of each id (roots are their own parent).
+        Unknown ids give NaN.
+        '''
+        pos = self._positions(ids)
+        return(self._to_ids(np.where(pos < 0, -1, self.parent[pos])))
+
+    def get_level(self, ids):
+        ''' Returns the level of each id (0 at the root). Unknown ids give
+        NaN.
+        '''
+        pos = self._positions(ids)
+        out = self.level[np.maximum(pos, 0)]
+        if (pos < 0).any():
+            out = np.where(pos < 0, np.nan, out)
+        return(out)
+
+    def get_ancestor_at_level(self, ids, level):
+        ''' Returns the ancestor of each id at the given level. Ids above
+        that level, or unknown, give NaN.
+        '''
+        pos = self._positions(ids)
+        if level < 0 or level > self.max_level:
+            return(np.full(pos.shape, np.nan))
+        anc = np.where(pos < 0, -1, self.ancestors[np.maximum(pos, 0), level])
+        return(self._to_ids(anc))
+
+    def get_flag(self, ids, flag):
+        ''' Returns the metadata flag (e.g. most_detailed) of each id as
+        booleans. Unknown ids give False.
+        '''
+        if flag not in self.flags:
+            raise ValueError('Flag {} not available; tree has: {}.'.format(flag, ', '.join(self.flags)))
+        pos = self._positions(ids)
+        return((pos >= 0) & self.flags[flag][np.maximum(pos, 0)])
+
+    def is_most_detailed(self, ids):
+        ''' Returns whether each id is most detailed. '''
+        return(self.get_flag(ids, 'most_detailed'))
+
+    def is_descendant(self, ids, ancestor_ids):
+        ''' Returns whether each id lies at or below the corresponding (or
+        broadcast) ancestor id. Unknown ids give False.
+        '''
+        pos, anc = self._positions(ids), self._positions(ancestor_ids)
+        if len(self.ids) == 0:
+            return(np.zeros(np.broadcast(pos, anc).shape, dtype=bool))
+        tin = self.tin[np.maximum(pos, 0)]
+        out = ((pos >= 0) & (anc >= 0) &
+               (self.tin[np.maximum(anc, 0)] <= tin) & (tin < self.tout[np.maximum(anc, 0)]))
+        return(bool(out) if np.ndim(out) == 0 else out)
+
+    def descendants(self, id, include_self=True):
+        ''' Returns the ids at or below id in hierarchy order. '''
+        pos = int(self._positions(id))
+        if pos < 0:
+            raise ValueError('Supplied {} {} not in hierarchy.'.format(self.id_col, id))
+        start = self.tin[pos] if include_self else self.tin[pos] + 1
+        return(self.ids[self._tour[start:self.tout[pos]]])
+
+def _get_tree(kind, gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Internal function returning the session-cached hierarchy tree for
+    a round/decomp step or release.
+    '''
+    key = _metadata_key(kind, gbd_round_id, decomp_step, release_id)
+    with _metadata_lock:
+        if key in _tree_cache:
+            _record_cache_hit()
+            return(_tree_cache[key])
+    tree_class = LocationTree if kind == 'location' else CauseTree
+    tree = tree_class(_get_metadata(*key))
+    with _metadata_lock:
+        return(_tree_cache.setdefault(key, tree))
+
+#----------------------------------------#
+
+#----# Lazy Frame Helpers #----# 
+# dask DataFrames are recognized by module name, so dask is only imported
+# when one is actually passed in
+def _is_dask_frame(df):
+    ''' Internal function to check for a dask DataFrame. '''
+    return(type(df).__module__.split('.')[0] == 'dask' and hasattr(df, 'map_partitions'))
+
+def _is_chunked(df):
+    ''' Internal function to check for an iterator of DataFrame chunks
+    (e.g. from pd.read_csv with chunksize).
+    '''
+    return(isinstance(df, Iterator))
+
+def _seed_metadata(metadata):
+    ''' Internal function which seeds the metadata cache from a dictionary
+    of cache keys to metadata, so decorations in worker processes or dask
+    partitions never query the database themselves.
+    '''
+    with _metadata_lock:
+        for key, meta in metadata.items():
+            _metadata_cache.setdefault(key, meta)
+
+def _decorate_chunk(part, name, metadata, kwargs):
+    ''' Internal function applying the named add_* helper to one dask
+    partition against broadcast metadata.
+    '''
+    _seed_metadata(metadata)
+    return(globals()[name](part, **kwargs))
+
+def _map_chunks(func, chunks, kwargs):
+    ''' Internal generator applying func to each chunk in turn. '''
+    for chunk in chunks:
+        yield func(chunk, **kwargs)
+
+def _lazy_frames(func):
+    ''' Internal decorator letting an add_* helper take a dask DataFrame or
+    an iterator of DataFrame chunks. dask input returns a dask DataFrame
+    decorated partition by partition against metadata fetched once here and
+    broadcast with the graph; chunked input returns a generator of
+    decorated chunks.
+    '''
+    sig = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        df = kwargs.get('df', args[0] if args else None)
+        if not (_is_dask_frame(df) or _is_chunked(df)):
+            return(func(*args, **kwargs))
+
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        kwargs = {k: v for k, v in bound.arguments.items() if k != 'df'}
+        if _is_chunked(df):
+            return(_map_chunks(func, df, kwargs))
+
+        import dask
+        if kwargs['inplace'] or kwargs['normalize']:
+            raise ValueError('Supplied inplace and normalize are not supported for dask DataFrames.')
+        kind = _decorations[func.__name__][0]
+        key = _metadata_key(kind, kwargs['gbd_round_id'], kwargs['decomp_step'], kwargs['release_id'])
+        metadata = {key: _get_metadata(*key)}
+        _, kwargs['gbd_round_id'], kwargs['decomp_step'], kwargs['release_id'] = key
+        # Running the helper on the empty meta frame validates the columns
+        # up front and gives the output schema
+        meta = func(df._meta, **kwargs)
+        return(df.map_partitions(_decorate_chunk, func.__name__, dask.delayed(metadata, pure=True),
+                                 kwargs, meta=meta))
+    return(wrapper)
+
+def _collapse_partial(df, agg_function, group_cols, calc_cols):
+    ''' Internal function for the map step of a chunked collapse: one
+    grouped partial aggregate per chunk (sums and counts for a mean).
+    '''
+    if any(col not in df.columns for col in group_cols + calc_cols):
+        raise ValueError('One or more supplied group_cols or calc_cols not found in df columns.')
+    g = df.groupby(group_cols)[calc_cols]
+    if agg_function != 'mean':
+        return(g.agg(agg_function))
+    counts = g.count()
+    counts.columns = ['_n_{}'.format(c) for c in calc_cols]
+    return(pd.concat([g.sum(), counts], axis=1))
+
+def _collapse_combine(parts, agg_function):
+    ''' Internal function for the combine step of a chunked collapse,
+    merging partial aggregates into one.
+    '''
+    t = pd.concat(parts)
+    func = 'sum' if agg_function in ['sum', 'mean'] else agg_function
+    return(t.groupby(level=list(range(t.index.nlevels))).agg(func))
+
+def _collapse_chunks(chunks, agg_function, group_cols, calc_cols, split_every):
+    ''' Internal function to collapse an iterator of DataFrame chunks with
+    a map/combine/reduce tree, combining every split_every partials so at
+    most split_every partials per tree level are held at once.
+    '''
+    levels = []
+    for chunk in chunks:
+        if calc_cols is None:
+            calc_cols = [c for c in chunk.columns if c not in group_cols]
+        part = _collapse_partial(chunk, agg_function, group_cols, calc_cols)
+        for level in levels:
+            level.append(part)
+            if len(level) < split_every:
+                part = None
+                break
+            part = _collapse_combine(level, agg_function)
+            level.clear()
+        if part is not None:
+            levels.append([part])
+    parts = [p for level in levels for p in level]
+    if len(parts) == 0:
+        raise ValueError('Supplied df contains no chunks.')
+
+    g = _collapse_combine(parts, agg_function)
+    if agg_function == 'mean':
+        counts = g[['_n_{}'.format(c) for c in calc_cols]].to_numpy()
+        g = g[calc_cols] / np.where(counts == 0, np.nan, counts)
+    return(g.reset_index())
+
+#------------------------------#
+
+#----# Decoration Registry #----# 
+# Each add_* helper is one entry of (kind, attr, keys): the metadata it
+# reads, the column it adds and the df columns attr can be looked up from,
+# in order of precedence. A key is a metadata column, or a (column, level)
+# pair looked up in the metadata like any other key, with ids the metadata
+# has no value for (e.g. deep subnationals) resolved as their ancestor at
+# that level of the kind's tree. Lookups keep the first metadata row per
+# key, so keys coarser than attr (e.g. region_id for super_region_name)
+# still map one to one.
+_decorations = {
+    'add_ihme_loc_id' : ('location', 'ihme_loc_id', ['location_id', 'location_name']),
+    'add_location_name' : ('location', 'location_name', ['ihme_loc_id', 'location_id']),
+    'add_region_id' : ('location', 'region_id', ['ihme_loc_id', ('location_id', 2), 'location_name',
+                                                 'region_name']),
+    'add_region_name' : ('location', 'region_name', ['ihme_loc_id', 'location_id', 'location_name',
+                                                     'region_id']),
+    'add_super_region_id' : ('location', 'super_region_id', ['ihme_loc_id', ('location_id', 1), 'location_name',
+                                                             'region_id', 'region_name', 'super_region_name']),
+    'add_super_region_name' : ('location', 'super_region_name', ['ihme_loc_id', 'location_id', 'location_name',
+                                                                 'region_id', 'region_name', 'super_region_id']),
+    'add_loc_lancet_label' : ('location', 'lancet_label', ['ihme_loc_id', 'location_id', 'location_name']),
+    'add_loc_who_label' : ('location', 'who_label', ['ihme_loc_id', 'location_id', 'location_name']),
+    'add_cause_id' : ('cause', 'cause_id', ['acause', 'cause_name']),
+    'add_acause' : ('cause', 'acause', ['cause_id', 'cause_name']),
+    'add_cause_name' : ('cause', 'cause_name', ['cause_id', 'acause']),
+    'add_cause_lancet_label' : ('cause', 'lancet_label', ['cause_id', 'acause', 'cause_name'])
+}
+# Indexed lookups of attr by key, keyed by (metadata key, key, attr)
+_lookup_cache = {}
+
+def _key_codes(col):
+    ''' Internal function to factorize a key column, reusing categorical
+    codes where it is categorical.
+    '''
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return(col.cat.codes.to_numpy(), col.cat.categories)
+    return(pd.factorize(col))
+
+def _get_lookup(key, on, attr):
+    ''' Internal function returning the session-cached Series of attr
+    indexed by `on`, from the metadata for a cache key deduplicated on
+    `on`. The index's hash table is built on first use and kept with it.
+    '''
+    with _metadata_lock:
+        if (key, on, attr) in _lookup_cache:
+            _record_cache_hit()
+            return(_lookup_cache[(key, on, attr)])
+    meta = _get_metadata(*key)
+    lookup = meta[[on, attr]].drop_duplicates(on).set_index(on)[attr]
+    with _metadata_lock:
+        return(_lookup_cache.setdefault((key, on, attr), lookup))
+
+def _decorate(df, name, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+              inplace=False):
+    ''' Internal engine behind the add_* helpers, adding the attr registered
+    for name from the first of its keys df has. If attr already exists in
+    df, only its missing values are filled.
+    '''
+    kind, attr, keys = _decorations[name]
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError('Supplied df is not a pandas DataFrame.')
+    cols = [k[0] if isinstance(k, tuple) else k for k in keys]
+    present = [k for k, c in zip(keys, cols) if c in df.columns]
+    if len(present) == 0:
+        sep = ', or ' if len(cols) > 2 else ' or '
+        raise ValueError('Supplied df does not contain column for {}{}{}.'.format(', '.join(cols[:-1]), sep, cols[-1]))
+    if attr in df.columns:
+        if df[attr].notnull().all():
+            return(normalize_frame(df, inplace=inplace) if normalize else df)
+
+    key = _metadata_key(kind, gbd_round_id, decomp_step, release_id)
+    on = present[0]
+    if isinstance(on, tuple):
+        on, level = on
+        t = _merge_attr(df, _get_lookup(key, on, attr), on, attr, inplace)
+        if t[attr].isnull().any():
+            t = _tree_attr(t, _get_tree(*key), on, level, attr, inplace=True)
+    else:
+        t = _merge_attr(df, _get_lookup(key, on, attr), on, attr, inplace)
+
+    if normalize:
+        t = normalize_frame(t, inplace=inplace)
+    return(t)
+
+#-------------------------------#
+
+#----# Result Cache #----# 
+# Opt-in on-disk cache of collapse and draw aggregation results, keyed by a
+# hash of the input frame and call arguments (see use_result_cache). The
+# SURGE_RESULT_CACHE environment variable sets the directory.
+_result_cache = {'path' : os.environ.get('SURGE_RESULT_CACHE') or None, 'max_bytes' : 2 ** 30}
+
+def _hash_frame(df):
+    ''' Internal function to hash a DataFrame's column names, dtypes, index
+    and values. Values are hashed column by column in vectorized form, so
+    the cost is one pass over the frame's buffers.
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return(h.hexdigest())
+
+def _write_result(out, path, max_bytes):
+    ''' Internal function to store a result as Parquet (written to a
+    temporary file and renamed, so readers never see a partial file), then
+    evict the least recently used results until the cache fits max_bytes.
+    Results Parquet can't hold are simply not cached.
+    '''
+    cache_dir = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        out.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except (ValueError, TypeError, NotImplementedError):
+        os.remove(tmp_path)
+        return
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.parquet'):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(e[1] for e in entries)
+    for _, size, file in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _cached_result(func):
+    ''' Internal decorator serving repeated calls on an identical pandas
+    DataFrame with identical arguments from the result cache while one is
+    set. Hits refresh the file's modification time, which orders eviction.
+    Lazy inputs and frames which can't be hashed always compute.
+    '''
+    sig = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache_dir = _result_cache['path']
+        df = kwargs.get('df', args[0] if args else None)
+        if cache_dir is None or not isinstance(df, pd.DataFrame):
+            return(func(*args, **kwargs))
+        try:
+            bound = sig.bind(*args, **kwargs)
+            frame_hash = _hash_frame(df)
+        except TypeError:
+            return(func(*args, **kwargs))
+        bound.apply_defaults()
+        call_args = [(k, v) for k, v in bound.arguments.items() if k != 'df']
+        key = '{}|{}|{!r}'.format(func.__name__, frame_hash, call_args)
+        path = os.path.join(cache_dir, '{}-{}.parquet'.format(func.__name__, 
+                            hashlib.blake2b(key.encode(), digest_size=16).hexdigest()))
+
+        if os.path.isfile(path):
+            try:
+                out = pd.read_parquet(path)
+                os.utime(path)
+            except (OSError, ValueError):
+                # Evicted or replaced by another process mid-read
+                out = None
+            if out is not None:
+                _record_cache_hit()
+                return(out)
+
+        out = func(*args, **kwargs)
+        _write_result(out, path, _result_cache['max_bytes'])
+        return(out)
+    return(wrapper)
+
+def use_result_cache(path, max_bytes=2 ** 30):
+    ''' Convenience function to cache the results of collapse,
+    aggregate_long_draws and aggregate_wide_draws on disk, so rerunning a
+    call on an identical DataFrame with identical arguments reads the result
+    back instead of recomputing it. Pass None to stop caching.
+
+    Arguments:
+    path : str
+           Cache directory, or None. Created if needed.
+    max_bytes : int, default 2 ** 30
+                Size bound of the cache. The least recently used results
+                are evicted beyond it.
+    '''
+    if path is not None and not isinstance(path, str):
+        raise TypeError('Supplied path is not a string.')
+    if not isinstance(max_bytes, int) or max_bytes < 0:
+        raise ValueError('Supplied max_bytes must be a non-negative integer.')
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    _result_cache['path'] = path
+    _result_cache['max_bytes'] = max_bytes
+
+@contextmanager
+def result_cache(path, max_bytes=2 ** 30):
+    ''' Context manager which caches results (see use_result_cache) only
+    inside it, restoring the previous setting on exit.
+
+    Arguments:
+    path : str
+           Cache directory. Created if needed.
+    max_bytes : int, default 2 ** 30
+                Size bound of the cache.
+    '''
+    previous = dict(_result_cache)
+    use_result_cache(path, max_bytes)
+    try:
+        yield path
+    finally:
+        _result_cache.update(previous)
+
+def clear_result_cache(path=None):
+    ''' Convenience function to delete every cached result.
+
+    Arguments:
+    path : str (optional)
+           Cache directory. Defaults to the active one.
+    '''
+    path = path or _result_cache['path']
+    if path is None or not os.path.isdir(path):
+        return
+    for entry in os.scandir(path):
+        if entry.name.endswith('.parquet'):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+#------------------------#
+
 #----# Data Manipulation and Calculation Functions #----# 
-def collapse(df, agg_function='sum', group_cols=None, calc_cols=None):
+def _output_frame(df, inplace):
+    ''' Internal function returning the frame a helper should write its
+    output columns into. With inplace, this is df itself. Otherwise it is a
+    shallow copy, so no column data is duplicated: helpers only ever add or
+    replace whole columns, which never writes into arrays shared with df,
+    and under pandas copy-on-write the copy is lazy anyway.
+    '''
+    if inplace:
+        return(df)
+    return(df.copy(deep=False))
+
+def _merge_attr(df, lookup, on, attr, inplace=False):
+    ''' Internal function which adds attr to df by looking up df[on] in
+    lookup, a Series of attr indexed by unique `on` values (see
+    _get_lookup). Behaves like a left merge, but keeps df's rows, order and
+    index and never copies df's other columns. If attr already exists in
+    df, only its missing values are filled. Name columns are matched
+    through match_names, and any names left unmatched are reported in a
+    warning, which the default filter shows once per distinct message
+    rather than once per chunk or partition.
+
+    Keys are resolved once per unique value (reusing categorical codes
+    where df[on] is categorical) and broadcast back with a single take, so
+    the cost of the lookup doesn't grow with the number of rows.
+    '''
+    codes, uniques = _key_codes(df[on])
+
+    keys = pd.Series(uniques)
+    if on in _name_aliases:
+        keys = match_names(keys, lookup.index, aliases=_name_aliases[on])
+        unmatched = uniques[keys.isnull().to_numpy()]
+        if len(unmatched) > 0:
+            warnings.warn('{} unmatched {} value(s): {}'.format(len(unmatched), on, ', '.join(map(str, unmatched[:10]))),
+                          stacklevel=2)
+
+    pos = lookup.index.get_indexer(keys)
+    # Extension arrays (e.g. arrow strings) are taken natively to avoid a
+    # round trip through Python objects
+    if isinstance(lookup.dtype, pd.api.extensions.ExtensionDtype):
+        values = lookup.array
+    else:
+        values = lookup.to_numpy()
+    values = pd.api.extensions.take(values, pos, allow_fill=True)
+    values = pd.api.extensions.take(values, codes, allow_fill=True)
+    return(_assign_attr(df, attr, values, inplace))
+
+def _assign_attr(df, attr, values, inplace=False):
+    ''' Internal function which sets df[attr] to values, filling only the
+    missing values if attr already exists in df.
+    '''
+    t = _output_frame(df, inplace)
+    if attr in t.columns:
+        t[attr] = t[attr].where(t[attr].notnull(), values)
+    else:
+        t[attr] = values
+    return(t)
+
+@_instrumented
+@_cached_result
+def collapse(df, agg_function='sum', group_cols=None, calc_cols=None, normalize=False,
+             split_every=8):
     ''' Convenience function for STATA-like collapsing. Like STATA, removes
     any columns not specified in either group_cols or calc_cols.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame, a dask DataFrame (returns a dask DataFrame) or
+         an iterator of DataFrame chunks (returns a DataFrame). Lazy inputs
+         are collapsed with a map/combine/reduce tree aggregation.
     group_cols : str or list-like
                  Columns you want to use to group the data and collapse over.
     agg_function : str, default 'sum'
@@ -120,30 +1194,49 @@ def collapse(df, agg_function='sum', group_cols=None, calc_cols=None):
                 Columns you want to compute the aggregation function over
                 If no columns passed all columns will be aggregated (except
                 group columns).
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame). Not supported for dask DataFrames.
+    split_every : int, default 8
+                  For lazy inputs, the number of partial aggregates combined
+                  at each level of the tree.
     '''
     # Error handling
-    if not isinstance(df, pd.DataFrame):
+    lazy = _is_dask_frame(df) or _is_chunked(df)
+    if not isinstance(df, pd.DataFrame) and not lazy:
         raise TypeError('Input df is not a pandas DataFrame.')
     if agg_function not in ['sum', 'mean', 'min', 'max']:
         raise ValueError('Supplied agg_function not one of: sum, mean, min, max.')
+    if lazy and (not isinstance(split_every, int) or split_every < 2):
+        raise ValueError('Supplied split_every must be an integer of at least 2.')
 
     # Get columns and ensure proper var types
     if isinstance(group_cols, str):
         group_cols = [group_cols]
+    if isinstance(calc_cols, str):
+        calc_cols = [calc_cols]
+    if _is_chunked(df):
+        g = _collapse_chunks(df, agg_function, list(group_cols), calc_cols, split_every)
+        return(normalize_frame(g) if normalize else g)
+
     # Get all columns other than group_cols if no calc_cols given
     if not calc_cols:
         calc_cols = [c for c in list(df) if c not in group_cols]
-    if isinstance(calc_cols, str):
-        calc_cols = [calc_cols]
 
     if any(col not in df.columns for col in group_cols):
         raise ValueError('One or more supplied group_cols not found in df columns.')
     if any(col not in df.columns for col in calc_cols):
         raise ValueError('One or more supplied calc_cols not found in df columns.')
 
-    # Remove columns that are not included in group or aggregation calculation
-    # (mimics STATA behavior)
-    df = df[group_cols + calc_cols]
+    # dask's groupby aggregation is itself a tree reduction
+    if lazy:
+        if normalize:
+            raise ValueError('Supplied normalize is not supported for dask DataFrames.')
+        g = df.groupby(group_cols)[calc_cols].agg(agg_function, split_every=split_every)
+        return(g.reset_index())
+
+    # Only group_cols and calc_cols are carried into the result (mimics
+    # STATA behavior) -- grouping df directly avoids copying a subset first
     g = df.groupby(group_cols)
 
     # Make the calculation
@@ -156,9 +1249,14 @@ def collapse(df, agg_function='sum', group_cols=None, calc_cols=None):
     elif agg_function == 'max':
         g = g[calc_cols].agg(np.max)
 
-    return g.reset_index()
+    g = g.reset_index()
+    if normalize:
+        g = normalize_frame(g)
+    return g
 
-def rowtotal(df, new_colname=None, rowtotal_cols=None):
+@_instrumented
+def rowtotal(df, new_colname=None, rowtotal_cols=None, missing='ignore', normalize=False,
+             inplace=False):
     ''' Convenience function to perform STATA-like row total.
 
     Arguments:
@@ -169,6 +1267,16 @@ def rowtotal(df, new_colname=None, rowtotal_cols=None):
     rowtotal_cols : str or list-like
                     A string or list containing the names of the existing columns
                     you wish to total.
+    missing : str, default 'ignore'
+              How missing values are handled (see row_ops). 'ignore' treats
+              them as 0 like STATA rowtotal; 'all' returns missing when every
+              value is missing like STATA's missing option.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds new_colname to df itself rather than returning
+              a new DataFrame.
     '''
     # Error handling
     if not isinstance(df, pd.DataFrame):
@@ -182,11 +1290,146 @@ def rowtotal(df, new_colname=None, rowtotal_cols=None):
         raise ValueError('One or more supplied rowtotal_cols not found in df columns.')
 
     # Make the calculation
-    df[new_colname] = df[rowtotal_cols].sum(axis=1)
+    return(row_ops(df, {new_colname : ('sum', rowtotal_cols)}, missing=missing, normalize=normalize, 
+                   inplace=inplace))
+
+def _row_op(block, op, missing, weights=None):
+    ''' Internal function to apply a row operation to a 2-D float block. '''
+    nans = np.isnan(block)
+    if missing == 'propagate':
+        if op == 'sum':
+            res = block.sum(axis=1)
+        elif op == 'mean':
+            res = block.mean(axis=1)
+        elif op == 'min':
+            res = block.min(axis=1)
+        elif op == 'max':
+            res = block.max(axis=1)
+        elif op == 'product':
+            res = block.prod(axis=1)
+        else:
+            res = block @ weights
+    else:
+        if op == 'sum':
+            res = np.nansum(block, axis=1)
+        elif op == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                res = np.nansum(block, axis=1) / (~nans).sum(axis=1)
+        elif op == 'min':
+            res = np.fmin.reduce(block, axis=1)
+        elif op == 'max':
+            res = np.fmax.reduce(block, axis=1)
+        elif op == 'product':
+            res = np.nanprod(block, axis=1)
+        else:
+            res = np.where(nans, 0, block) @ weights
+        if missing == 'all':
+            res = np.where(nans.all(axis=1), np.nan, res)
+    return(res)
 
-    return(df)
+@_instrumented
+def row_ops(df, ops, missing='ignore', chunk_size=None, normalize=False, inplace=False):
+    ''' Convenience function to compute several row-wise columns (like
+    STATA's egen row functions) from one extraction of the columns they use.
+
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame.
+    ops : dict
+          Maps each new column name to a tuple of (op, cols), or
+          (op, cols, weights) for op wsum. op is one of: sum, mean, min,
+          max, product, wsum (weighted sum). cols is a str or list-like of
+          existing columns; weights is a list-like the same length as cols.
+    missing : str, default 'ignore'
+              How missing values are handled. One of:
+              ignore - skip missing values (sum treats them as 0, like
+                       STATA rowtotal)
+              all - as ignore, but the result is missing when every value
+                    in the row is missing (like STATA's missing option)
+              propagate - the result is missing if any value is missing
+    chunk_size : int (optional)
+                 If supplied, processes this many rows at a time to limit
+                 the size of the extracted block for very wide frames.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the new columns to df itself rather than
+              returning a new DataFrame.
+    '''
+    # Error handling
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError('Supplied df is not a pandas DataFrame.')
+    if not isinstance(ops, dict) or len(ops) == 0:
+        raise TypeError('Supplied ops is not a non-empty dictionary.')
+    if missing not in ['ignore', 'all', 'propagate']:
+        raise ValueError('Supplied missing not one of: ignore, all, propagate.')
+    if chunk_size is not None:
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError('Supplied chunk_size is not a positive integer.')
+    if any(c in df.columns for c in ops):
+        raise ValueError('One or more new column names already exist in df.')
+
+    specs = {}
+    for new_col, spec in ops.items():
+        op, cols = spec[0], spec[1]
+        weights = spec[2] if len(spec) > 2 else None
+        if op not in ['sum', 'mean', 'min', 'max', 'product', 'wsum']:
+            raise ValueError('Supplied op for {} not one of: sum, mean, min, max, product, wsum.'.format(new_col))
+        if isinstance(cols, str):
+            cols = [cols]
+        if len(cols) == 0:
+            raise ValueError('Supplied columns for {} are blank.'.format(new_col))
+        if any(c not in df.columns for c in cols):
+            raise ValueError('One or more columns for {} not found in df columns.'.format(new_col))
+        if op == 'wsum':
+            if weights is None or len(weights) != len(cols):
+                raise ValueError('Supplied weights for {} must be the same length as its columns.'.format(new_col))
+            weights = np.asarray(weights, dtype=np.float64)
+        specs[new_col] = (op, list(cols), weights)
+
+    # Extract the union of the needed columns once (per chunk)
+    all_cols = []
+    for _, cols, _ in specs.values():
+        all_cols += [c for c in cols if c not in all_cols]
+    col_pos = df.columns.get_indexer(all_cols)
+    block_pos = {c : pos for pos, c in enumerate(all_cols)}
+    selectors = {}
+    for new_col, (_, cols, _) in specs.items():
+        idx = [block_pos[c] for c in cols]
+        # Contiguous columns are sliced (a view) rather than gathered
+        if idx == list(range(idx[0], idx[0] + len(idx))):
+            selectors[new_col] = slice(idx[0], idx[0] + len(idx))
+        else:
+            selectors[new_col] = idx
+
+    n_rows = len(df)
+    chunk_size = chunk_size or max(n_rows, 1)
+    results = {new_col : np.empty(n_rows) for new_col in specs}
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        block = df.iloc[start:stop, col_pos].to_numpy(dtype=np.float64)
+        for new_col, (op, _, weights) in specs.items():
+            results[new_col][start:stop] = _row_op(block[:, selectors[new_col]], op, missing, weights)
+
+    # Sums, products and extremes of integer columns stay integer, as in
+    # pandas (integer columns can't hold missing values)
+    for new_col, (op, cols, _) in specs.items():
+        if op in ['sum', 'min', 'max', 'product'] and all(pd.api.types.is_integer_dtype(df[c].dtype) and
+                                                          not isinstance(df[c].dtype, pd.api.extensions.ExtensionDtype)
+                                                          for c in cols):
+            results[new_col] = results[new_col].astype(np.int64)
+
+    t = _output_frame(df, inplace)
+    for new_col, res in results.items():
+        t[new_col] = res
+
+    if normalize:
+        t = normalize_frame(t, inplace=inplace)
+    return(t)
 
-def wide_to_long(df, stubnames, i, j, new_index=False, drop_others=False):
+@_instrumented
+def wide_to_long(df, stubnames, i, j, new_index=False, drop_others=False, normalize=False):
     ''' A convenience function to reshape a DataFrame wide to long.
 
     Arguments:
@@ -208,6 +1451,9 @@ def wide_to_long(df, stubnames, i, j, new_index=False, drop_others=False):
                   Note that this won't work well with the desired future
                   development of being able to reshape multiple stubnames.
                   Consider which features are most important.
+    normalize : Boolean, default=False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
     '''
     def get_varnames(df, stub):
         return(df.filter(regex=stub).columns.tolist())
@@ -251,24 +1497,27 @@ def wide_to_long(df, stubnames, i, j, new_index=False, drop_others=False):
     non_stubs = [c for c in df.columns if c not in stubcols+i]
     for pos, stub in enumerate(stubnames):
         jval = j[pos]
-        temp_df = df.copy()
-        # Drop extra columns if requested
+        # Drop extra columns if requested (selecting columns already makes
+        # a new frame, so df itself is never copied or modified)
         if drop_others:
-            temp_df = temp_df[i + get_varnames(df, stub)]
+            temp_df = df[i + get_varnames(df, stub)]
         else:
-            temp_df = temp_df[i + get_varnames(df, stub) + non_stubs]
+            temp_df = df[i + get_varnames(df, stub) + non_stubs]
         # add melted data to output dataframe 
         if pos == 0:
             newdf = melt_stub(temp_df, stub, jval)
         else:
             newdf = newdf.merge(melt_stub(temp_df, stub, jval))
 
+    if normalize:
+        newdf = normalize_frame(newdf)
     if new_index:
         return newdf.set_index(i + j)
     else:
         return newdf
 
-def long_to_wide(df, stub, i, j, drop_others=False):
+@_instrumented
+def long_to_wide(df, stub, i, j, drop_others=False, normalize=False):
     ''' Convenience function to reshape DataFrame long to wide.
 
     Arguments:
@@ -286,13 +1535,16 @@ def long_to_wide(df, stub, i, j, drop_others=False):
                   If true, will drop any columns not specified in either i or j.
                   Otherwise all columns will be included as additional
                   identifier columns.
+    normalize : bool, default=False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
     '''
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
     
     if isinstance(i, str):
         i = [i]
-    if isinstance(df.index, pd.core.index.MultiIndex):
+    if isinstance(df.index, pd.MultiIndex):
         df = df.reset_index()
     # Error Checking
     if df[i + [j]].duplicated().any():
@@ -303,12 +1555,15 @@ def long_to_wide(df, stub, i, j, drop_others=False):
         if df.loc[df[j] != df[j].astype(int), j].any():
             print(
                 "Decimal values cannot be used in reshape suffix. {} coerced to integer".format(j))
-        df.loc[:, j] = df[j].astype(int)
+        j_vals = df[j].astype(int)
     else:
-        df.loc[:, j] = df[j].astype(str)
+        j_vals = df[j].astype(str)
+    # Replace j on a shallow copy so the caller's df is left untouched
+    df = _output_frame(df, inplace=False)
+    df[j] = j_vals
     # Perform reshape
     if drop_others:
-        df = df[i + [j]]
+        df = df[i + [j, stub]]
     else:
         i = [x for x in list(df) if x not in [stub, j]]
     df = df.set_index(i + [j]).unstack(fill_value=np.nan)
@@ -320,9 +1575,14 @@ def long_to_wide(df, stub, i, j, drop_others=False):
     # Set columns to the stub+suffix name and remove MultiIndex
     df.columns = cols
     df = df.reset_index()
+    if normalize:
+        df = normalize_frame(df)
     return df
 
-def aggregate_long_draws(df, id_cols, value_col):
+@_instrumented
+@_cached_result
+def aggregate_long_draws(df, id_cols, value_col, normalize=False, method='exact',
+                         relative_error=0.01, validate=True):
     ''' Convenience function which aggregates draws in long format.
 
     Arguments:
@@ -333,36 +1593,74 @@ def aggregate_long_draws(df, id_cols, value_col):
               identify rows.
     value_col : str
                 A single column name identifying draw values.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    method : str, default 'exact'
+             One of exact, sketch. sketch estimates lower and upper from
+             mergeable quantile sketches (see sketch_long_draws) rather than
+             sorting each group; the mean stays exact.
+    relative_error : float, default 0.01
+                     For method='sketch', the relative accuracy of lower and
+                     upper.
+    validate : bool, default True
+               If false, skips checking id_cols and value_col for NAs (for
+               trusted inputs).
     '''
     # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
+    if method not in ['exact', 'sketch']:
+        raise ValueError('Supplied method not one of: exact, sketch.')
     if isinstance(id_cols, str):
         id_cols = [id_cols]
     if len(id_cols) == 0:
         raise ValueError('Supplied id_cols are blank.')
     if any(c not in df.columns.values for c in id_cols):
         raise ValueError('One or more supplied id_cols are not in df columns.')
-    for col in id_cols:
-        if df[col].isnull().any():
-            raise ValueError('Values in {} contain NAs. Please fix.'.format(col))
     if not isinstance(value_col, str):
         raise TypeError('Supplied value_col is not a string.')
     if len(value_col) == 0:
         raise ValueError('Supplied value_col is blank.')
     if value_col not in df.columns:
         raise ValueError('Supplied value_col not present in df columns.')
-    if df[value_col].isnull().any():
-        raise ValueError('Values in {} contain NAs. Please fix.'.format(value_col))
+    if validate:
+        # One vectorized scan over all the checked columns
+        nulls = df[id_cols + [value_col]].isnull().any()
+        if nulls.any():
+            raise ValueError('Values in {} contain NAs. Please fix.'.format(', '.join(map(str, nulls.index[nulls]))))
+
+    if method == 'sketch':
+        sketch = sketch_long_draws(df, id_cols, value_col, relative_error)
+        stats = summarize_draw_sketches(sketch, id_cols, relative_error).set_index(id_cols)
+    else:
+        g = df.groupby(id_cols)[value_col]
+        stats = pd.concat([g.quantile(0.025).rename('lower'), g.mean().rename('mean'), 
+                           g.quantile(0.975).rename('upper')], axis=1)
 
+    # One row per group in order of first appearance, indexed by its first
+    # row in df, with the statistics looked up by key so they stay aligned
     t = df.drop_duplicates(id_cols)[id_cols]
-    t['lower'] = df.groupby(id_cols)[value_col].quantile(0.025).values
-    t['mean'] = df.groupby(id_cols)[value_col].mean().values
-    t['upper'] = df.groupby(id_cols)[value_col].quantile(0.975).values
+    keys = pd.MultiIndex.from_frame(t) if len(id_cols) > 1 else pd.Index(t[id_cols[0]])
+    pos = stats.index.get_indexer(keys)
+    for col in ['lower', 'mean', 'upper']:
+        t[col] = pd.api.extensions.take(stats[col].to_numpy(), pos, allow_fill=True)
+
+    t = t.reset_index()
+    if normalize:
+        t = normalize_frame(t)
+    return(t)
 
-    return(t.reset_index())
+def _draw_mask(df, draw_col_stub):
+    ''' Internal function returning a boolean array marking the columns of
+    df which contain draw_col_stub, in one vectorized string match.
+    '''
+    return(np.asarray(df.columns.astype(str).str.contains(draw_col_stub, regex=False), dtype=bool))
 
-def aggregate_wide_draws(df, draw_col_stub):
+@_instrumented
+@_cached_result
+def aggregate_wide_draws(df, draw_col_stub, normalize=False, quantiles=(0.025, 0.975),
+                         chunk_size=None, validate=True):
     ''' Convenience function which aggregates draws in wide format.
 
     Arguments:
@@ -370,442 +1668,1447 @@ def aggregate_wide_draws(df, draw_col_stub):
          A pandas DataFrame.
     draw_col_stub : str
                     A stub matching each column containing draws.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    quantiles : list-like, default (0.025, 0.975)
+                Quantiles reported as lower and upper (linear
+                interpolation, as in R's type 7).
+    chunk_size : int (optional)
+                 Number of rows summarized at a time, bounding the memory
+                 used for the draw block. Defaults to all rows at once.
+    validate : bool, default True
+               If false, skips checking the draws for NAs (for trusted
+               inputs). Rows with NAs then summarize to NaN.
     '''
     # Error handing
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
     if len(draw_col_stub) == 0:
         raise ValueError('Supplied blank draw_col_stub.')
-    if all(draw_col_stub not in c for c in df.columns.values):
+    if len(quantiles) != 2 or not 0 <= quantiles[0] <= quantiles[1] <= 1:
+        raise ValueError('Supplied quantiles must be two increasing values between 0 and 1.')
+    if chunk_size is not None and (not isinstance(chunk_size, int) or chunk_size < 1):
+        raise ValueError('Supplied chunk_size must be a positive integer.')
+    is_draw = _draw_mask(df, draw_col_stub)
+    if not is_draw.any():
         raise ValueError('Supplied draw_col_stub not found in any df columns.')
-    draw_cols = df.columns.values
-    draw_cols = draw_cols[np.array([draw_col_stub in c for c in draw_cols])]
-    for col in draw_cols:
-        if df[col].isnull().any():
-            raise ValueError('Values in {} contain NAs. Please fix.'.format(col))
-
-    keep_cols = df.columns.values
-    keep_cols = keep_cols[np.array([draw_col_stub not in c for c in keep_cols])]
+    draw_idx = np.flatnonzero(is_draw)
+    keep_cols = df.columns.values[~is_draw]
 
     t = df.drop_duplicates(keep_cols).reset_index()[keep_cols]
-    t['lower'] = df[draw_cols].quantile(0.025, axis=1).values
-    t['mean'] = df[draw_cols].mean(axis=1).values
-    t['upper'] = df[draw_cols].quantile(0.975, axis=1).values
 
+    # Summarize the draw block as one 2-D array per chunk of rows. Any NA
+    # makes its row mean NaN, so the block is only scanned for the
+    # offending columns when a mean comes out NaN.
+    n = len(df)
+    chunk_size = chunk_size or max(n, 1)
+    stats = np.empty((3, n))
+    has_na = np.zeros(len(draw_idx), dtype=bool)
+    for start in range(0, n, chunk_size):
+        block = df.iloc[start:start + chunk_size, draw_idx].to_numpy(dtype=np.float64)
+        means = block.mean(axis=1)
+        if validate and np.isnan(means).any():
+            has_na |= np.isnan(block).any(axis=0)
+        stats[[0, 2], start:start + len(block)] = np.quantile(block, quantiles, axis=1)
+        stats[1, start:start + len(block)] = means
+    if has_na.any():
+        raise ValueError('Values in {} contain NAs. Please fix.'.format(', '.join(map(str, df.columns[draw_idx[has_na]]))))
+    t['lower'] = stats[0]
+    t['mean'] = stats[1]
+    t['upper'] = stats[2]
+
+    if normalize:
+        t = normalize_frame(t)
     return(t)
 
-def add_loc_lancet_label(df):
-    ''' Convenience function which returns DataFrame with lancet_label column.
+# Supported draw_arithmetic operations and their numpy ufuncs
+_draw_ops = {'add' : np.add, 'subtract' : np.subtract, 'multiply' : np.multiply, 'divide' : np.divide}
+
+def _align_rows(left, right, id_cols):
+    ''' Internal function returning, for each row of left, the position of
+    the row of right with the same id_cols values (-1 if there is none).
+    Each key column is factorized over both frames together (so int and
+    float ids match) and the codes are folded into one compact integer key.
+    '''
+    n_left = len(left)
+    key = np.zeros(n_left + len(right), dtype=np.int64)
+    for col in id_cols:
+        codes, uniques = pd.factorize(pd.concat([left[col], right[col]], ignore_index=True))
+        if (codes < 0).any():
+            raise ValueError('Values in {} contain NAs. Please fix.'.format(col))
+        key, _ = pd.factorize(key * len(uniques) + codes)
+    right_key = pd.Index(key[n_left:])
+    if not right_key.is_unique:
+        raise ValueError('Supplied right has duplicate rows on id_cols.')
+    return(right_key.get_indexer(key[:n_left]))
+
+@_instrumented
+def draw_arithmetic(left, right, op, id_cols, draw_col_stub='draw_', how='inner', normalize=False):
+    ''' Convenience function to combine two sets of wide draws draw by draw
+    (e.g. deaths / population for rates), matching rows on id_cols. Rows
+    are aligned by factorized keys rather than a merge, and the operation
+    runs once over the 2-D draw arrays, so the output feeds straight into
+    aggregate_wide_draws.
 
     Arguments:
-    df : DataFrame
-        A pandas DataFrame
+    left : DataFrame
+           A pandas DataFrame of wide draws. Its non-draw columns are kept,
+           so it may carry more id columns than id_cols (e.g. cause_id).
+    right : DataFrame
+            A pandas DataFrame of wide draws with the same draw columns,
+            unique on id_cols. Its other non-draw columns are dropped.
+    op : str
+         One of add, subtract, multiply, divide (left op right).
+    id_cols : str or list-like
+              Columns to match rows of left and right on.
+    draw_col_stub : str, default 'draw_'
+                    A stub matching each column containing draws.
+    how : str, default 'inner'
+          One of inner (drop left rows without a match in right) or left
+          (keep them, with NaN draws).
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
     '''
     # Error handling
-    if not isinstance(df, pd.DataFrame):
-        raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id', 'location_id', 'location_name']):
-        raise ValueError('Supplied df is missing column for ihme_loc_id, location_id, or location_name.')
-    if 'lancet_label' in df.columns:
-        if df['lancet_label'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['lancet_label']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['ihme_loc_id','location_id','location_name','lancet_label']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    elif 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    else:
-        t = pd.merge(df, locs, on='location_name', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
+    if not isinstance(left, pd.DataFrame) or not isinstance(right, pd.DataFrame):
+        raise TypeError('Supplied left and right must be pandas DataFrames.')
+    if op not in _draw_ops:
+        raise ValueError('Supplied op not one of: {}.'.format(', '.join(_draw_ops)))
+    if how not in ['inner', 'left']:
+        raise ValueError('Supplied how not one of: inner, left.')
+    if isinstance(id_cols, str):
+        id_cols = [id_cols]
+    if len(id_cols) == 0:
+        raise ValueError('Supplied id_cols are blank.')
+    if any(c not in left.columns or c not in right.columns for c in id_cols):
+        raise ValueError('One or more supplied id_cols are not in both left and right columns.')
+    if len(draw_col_stub) == 0:
+        raise ValueError('Supplied blank draw_col_stub.')
+    is_draw = _draw_mask(left, draw_col_stub)
+    left_draws = left.columns[is_draw]
+    right_draws = right.columns[_draw_mask(right, draw_col_stub)]
+    if len(left_draws) == 0:
+        raise ValueError('Supplied draw_col_stub not found in any left columns.')
+    if set(left_draws) != set(right_draws):
+        raise ValueError('Supplied left and right do not have the same draw columns.')
+
+    pos = _align_rows(left, right, id_cols)
+    rows = np.flatnonzero(pos >= 0) if how == 'inner' else np.arange(len(left))
+    pos = pos[rows]
+    matched = pos >= 0
+
+    # Draw blocks are viewed draws x rows (pandas' own column-major layout)
+    # and combined a few draws at a time, so each gathered slice of right
+    # stays in cache. Right's draws are taken in left's order.
+    left_block = left.iloc[:, np.flatnonzero(is_draw)].to_numpy(dtype=np.float64).T
+    right_block = right.iloc[:, right.columns.get_indexer(left_draws)].to_numpy(dtype=np.float64).T
+    all_rows = len(rows) == len(left)
+    values = np.empty((len(left_draws), len(rows)))
+    values[:, ~matched] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, len(left_draws), 64):
+            block = left_block[start:start + 64]
+            if not all_rows:
+                block = np.take(block, rows, axis=1)
+            other = np.take(right_block[start:start + 64], pos[matched], axis=1)
+            if matched.all():
+                _draw_ops[op](block, other, out=values[start:start + 64])
+            else:
+                values[start:start + 64, matched] = _draw_ops[op](block[:, matched], other)
+
+    t = left.iloc[rows, np.flatnonzero(~is_draw)].reset_index(drop=True)
+    t = pd.concat([t, pd.DataFrame(values.T, columns=left_draws, copy=False)], axis=1)
+    if normalize:
+        t = normalize_frame(t)
     return(t)
 
-def add_loc_who_label(df):
-    ''' Convenience function which returns DataFrame with who_label column.
+@_instrumented
+def normalize_frame(df, draw_col_stub=None, categorize=False, label_cols=None, verbose=False, 
+                    inplace=False):
+    ''' Convenience function to shrink a DataFrame's memory footprint.
+    Downcasts any GBD id columns (location_id, cause_id, region_id,
+    super_region_id, age_group_id, sex_id, year_id) to the smallest
+    integer type that holds them.
 
     Arguments:
     df : DataFrame
-        A pandas DataFrame
+         A pandas DataFrame.
+    draw_col_stub : str (optional)
+                    A stub matching each draw column. If supplied, float64
+                    draw columns are converted to float32.
+    categorize : bool, default False
+                 If true, converts label columns to categoricals.
+    label_cols : str or list-like (optional)
+                 Label columns to categorize. Defaults to any GBD label
+                 columns (location_name, cause_name, etc.) in df.
+    verbose : bool, default False
+              If true, prints the number of bytes saved.
+    inplace : bool, default False
+              If true, converts the columns of df itself rather than
+              returning a converted copy.
     '''
     # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id', 'location_id', 'location_name']):
-        raise ValueError('Supplied df is missing column for ihme_loc_id, location_id, or location_name.')
-    if 'who_label' in df.columns:
-        if df['who_label'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['who_label']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['ihme_loc_id','location_id','location_name','who_label']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    elif 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    else:
-        t = pd.merge(df, locs, on='location_name', how='left')
+    if isinstance(label_cols, str):
+        label_cols = [label_cols]
+    if label_cols is None:
+        label_cols = [c for c in gbd_label_cols if c in df.columns]
+    elif any(c not in df.columns for c in label_cols):
+        raise ValueError('One or more supplied label_cols not found in df columns.')
+
+    if verbose:
+        start_bytes = df.memory_usage(deep=True).sum()
+
+    df = _output_frame(df, inplace)
+
+    for col in [c for c in gbd_id_cols if c in df.columns]:
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s):
+            df[col] = pd.to_numeric(s, downcast='integer')
+        elif pd.api.types.is_float_dtype(s):
+            # Ids with missing values stay floats (float32 holds GBD ids exactly)
+            if s.notnull().all() and (s == s.round()).all():
+                df[col] = pd.to_numeric(s.astype(np.int64), downcast='integer')
+            else:
+                df[col] = s.astype(np.float32)
+
+    if draw_col_stub is not None:
+        for col in [c for c in df.columns if draw_col_stub in c]:
+            if df[col].dtype == np.float64:
+                df[col] = df[col].astype(np.float32)
+
+    if categorize:
+        for col in label_cols:
+            if df[col].dtype.name != 'category':
+                df[col] = df[col].astype('category')
+
+    if verbose:
+        end_bytes = df.memory_usage(deep=True).sum()
+        print('  normalize_frame saved {} bytes ({} -> {}).'.format(start_bytes - end_bytes, start_bytes, end_bytes))
 
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+    return(df)
+
+@_instrumented
+def normalize_names(values):
+    ''' Convenience function to normalize names for matching: casefolds,
+    strips accents, and collapses punctuation and whitespace to single
+    spaces. Only the unique values are normalized, then mapped back.
+
+    Arguments:
+    values : Series or list-like
+             Names to normalize. Missing values stay missing.
+
+    Returns:
+    normalized : Series
+                 The normalized names, aligned to values.
+    '''
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    normed = [' '.join(''.join(ch if ch.isalnum() else ' ' 
+                               for ch in unicodedata.normalize('NFKD', str(u)) 
+                               if not unicodedata.combining(ch)).casefold().split())
+              for u in uniques]
+    normed = pd.api.extensions.take(np.array(normed, dtype=object), codes, allow_fill=True)
+    return(pd.Series(normed, index=values.index, dtype=object))
+
+@_instrumented
+def match_names(values, choices, aliases=None):
+    ''' Convenience function to match names against a set of canonical
+    names (e.g. location_name from get_location_metadata) regardless of
+    case, accents, punctuation or whitespace, optionally through a table
+    of alternate names. Where two choices normalize to the same name, the
+    first is used.
+
+    Arguments:
+    values : Series or list-like
+             Names to match.
+    choices : Series or list-like
+              Canonical names to match against.
+    aliases : dict (optional)
+              Maps alternate names to canonical names
+              (e.g. location_name_aliases).
+
+    Returns:
+    matched : Series
+              The canonical name for each value, aligned to values, or
+              missing where no match was found.
+    '''
+    values = pd.Series(values)
+    choices = pd.Series(choices).dropna().drop_duplicates()
+
+    # Exact matches need no normalization
+    codes, uniques = pd.factorize(values)
+    if pd.Index(uniques).isin(choices).all():
+        return(values.astype(object).where(values.notnull(), np.nan))
+
+    # Normalized key -> canonical name, built once from the choices
+    index = pd.Series(choices.values, index=normalize_names(choices).values)
+    if aliases:
+        alias_targets = pd.Series(list(aliases.values()))
+        alias_index = pd.Series(match_names(alias_targets, choices).values, 
+                                index=normalize_names(list(aliases.keys())).values).dropna()
+        index = pd.concat([index, alias_index[~alias_index.index.isin(index.index)]])
+    index = index[~index.index.duplicated()]
+
+    matched = index.reindex(normalize_names(uniques).values).values
+    matched = pd.api.extensions.take(matched.astype(object), codes, allow_fill=True)
+    return(pd.Series(matched, index=values.index, dtype=object))
+
+@_instrumented
+@_lazy_frames
+def add_loc_lancet_label(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                         inplace=False):
+    ''' Convenience function which returns DataFrame with lancet_label column.
+
+    Arguments:
+    df : DataFrame
+        A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+        chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_loc_lancet_label', gbd_round_id, decomp_step, release_id, normalize, inplace))
+
+@_instrumented
+@_lazy_frames
+def add_loc_who_label(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                      inplace=False):
+    ''' Convenience function which returns DataFrame with who_label column.
+
+    Arguments:
+    df : DataFrame
+        A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+        chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_loc_who_label', gbd_round_id, decomp_step, release_id, normalize, inplace))
 #-------------------------------------------------------#
 
-#----# GBD Location Tools #----# 
-def add_ihme_loc_id(df):
-    ''' Convenience function which returns DataFrame with ihme_loc_id column.
+#----# Draw Sketches #----# 
+# Log-bucket quantile sketches: a value x is counted in bucket
+# ceil(log_gamma(|x|)), gamma = (1 + e) / (1 - e), and estimated back as
+# 2 * gamma^k / (gamma + 1), within relative error e of x. Buckets are stored
+# as a single int64 key that sorts in value order (0 for zero, +/- offset
+# for positive/negative values), so sketches merge by summing counts.
+_sketch_offset = 2 ** 40
+
+def _sketch_gamma(relative_error):
+    ''' Internal function to validate relative_error and return gamma. '''
+    if not isinstance(relative_error, float) or not 0 < relative_error < 1:
+        raise ValueError('Supplied relative_error must be a float between 0 and 1.')
+    return((1 + relative_error) / (1 - relative_error))
+
+def _sketch_values(buckets, gamma):
+    ''' Internal function mapping bucket keys to their estimated values. '''
+    buckets = np.asarray(buckets, dtype=np.int64)
+    k = (np.abs(buckets) - _sketch_offset).astype(np.float64)
+    values = np.sign(buckets) * 2 * np.power(gamma, k) / (gamma + 1)
+    return(np.where(buckets == 0, 0.0, values))
+
+@_instrumented
+def sketch_long_draws(df, id_cols, value_col, relative_error=0.01):
+    ''' Convenience function which summarizes draws in long format as a
+    mergeable quantile sketch per group: counts and sums of draws in
+    logarithmic value buckets. Sketches of separate partitions can be
+    combined with merge_draw_sketches and summarized with
+    summarize_draw_sketches, using memory proportional to the number of
+    groups rather than draws.
 
     Arguments:
     df : DataFrame
          A pandas DataFrame.
+    id_cols : str or list-like
+              A single column name, or multiple which identify groups.
+    value_col : str
+                A single column name identifying draw values.
+    relative_error : float, default 0.01
+                     Relative accuracy of quantiles estimated from the
+                     sketch. Sketches must share relative_error to be merged.
+
+    Returns:
+    sketch : DataFrame
+             id_cols with bucket, count and sum columns.
     '''
     # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['location_id', 'location_name']):
-        raise ValueError('Supplied df does not contain columns for location_id or location_name.')
-    if 'ihme_loc_id' in df.columns:
-        if df['ihme_loc_id'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['ihme_loc_id']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['location_id','location_name','ihme_loc_id']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    else :
-        t = pd.merge(df, locs, on='location_name', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+    if isinstance(id_cols, str):
+        id_cols = [id_cols]
+    if any(c not in df.columns for c in list(id_cols) + [value_col]):
+        raise ValueError('One or more supplied id_cols or value_col not found in df columns.')
+    gamma = _sketch_gamma(relative_error)
 
-def add_location_name(df):
-    ''' Convenience function which returns a DataFrame with location_name column.
+    x = df[value_col].to_numpy(dtype=np.float64)
+    if np.isnan(x).any():
+        raise ValueError('Values in {} contain NAs. Please fix.'.format(value_col))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.ceil(np.log(np.abs(x)) / np.log(gamma))
+        buckets = np.where(x == 0, 0, np.sign(x) * (k + _sketch_offset)).astype(np.int64)
+
+    keys = [df[c] for c in id_cols] + [pd.Series(buckets, index=df.index, name='bucket')]
+    sketch = pd.Series(x, index=df.index).groupby(keys).agg(['size', 'sum'])
+    sketch = sketch.rename(columns={'size' : 'count'}).reset_index()
+    return(sketch)
+
+@_instrumented
+def merge_draw_sketches(sketches, id_cols):
+    ''' Convenience function which merges draw sketches (e.g. one per
+    partition) from sketch_long_draws into one.
+
+    Arguments:
+    sketches : list-like
+               DataFrames from sketch_long_draws, with the same id_cols and
+               relative_error.
+    id_cols : str or list-like
+              A single column name, or multiple which identify groups.
+    '''
+    if isinstance(id_cols, str):
+        id_cols = [id_cols]
+    sketches = list(sketches)
+    if len(sketches) == 0:
+        raise ValueError('No sketches supplied.')
+    cols = list(id_cols) + ['bucket', 'count', 'sum']
+    if any(c not in sk.columns for sk in sketches for c in cols):
+        raise ValueError('Supplied sketches must contain id_cols, bucket, count and sum columns.')
+    t = pd.concat([sk[cols] for sk in sketches], ignore_index=True)
+    return(t.groupby(list(id_cols) + ['bucket'], as_index=False)[['count', 'sum']].sum())
+
+@_instrumented
+def summarize_draw_sketches(sketch, id_cols, relative_error=0.01, quantiles=(0.025, 0.975)):
+    ''' Convenience function which estimates lower, mean and upper from a
+    draw sketch, like aggregate_long_draws. The mean is exact.
+
+    Arguments:
+    sketch : DataFrame
+             A sketch from sketch_long_draws or merge_draw_sketches.
+    id_cols : str or list-like
+              A single column name, or multiple which identify groups.
+    relative_error : float, default 0.01
+                     The relative_error the sketch was built with.
+    quantiles : list-like, default (0.025, 0.975)
+                Lower and upper quantiles to estimate.
+    '''
+    if isinstance(id_cols, str):
+        id_cols = [id_cols]
+    id_cols = list(id_cols)
+    gamma = _sketch_gamma(relative_error)
+    if len(quantiles) != 2 or not 0 <= quantiles[0] <= quantiles[1] <= 1:
+        raise ValueError('Supplied quantiles must be two increasing values between 0 and 1.')
+
+    sketch = sketch.sort_values(id_cols + ['bucket'], kind='stable')
+    g = sketch.groupby(id_cols, sort=False)
+    count = sketch['count'].to_numpy()
+    cum = g['count'].cumsum().to_numpy()
+    n = g['count'].transform('sum').to_numpy()
+    values = _sketch_values(sketch['bucket'], gamma)
+
+    t = g[['count', 'sum']].sum().reset_index()
+    t['mean'] = t['sum'] / t['count']
+    for name, q in zip(['lower', 'upper'], quantiles):
+        # Interpolate between the buckets holding the draws either side of
+        # (0-based) rank q * (n - 1), as the exact quantile does
+        rank = q * (n - 1)
+        est = []
+        for r in [np.floor(rank), np.ceil(rank)]:
+            hit = (cum > r) & (cum - count <= r)
+            est.append(values[hit])
+        frac = (rank - np.floor(rank))[cum == n]
+        t[name] = est[0] + frac * (est[1] - est[0])
+    return(t[id_cols + ['lower', 'mean', 'upper']])
+
+@_instrumented
+def sketch_accuracy_report(df, id_cols, value_col, relative_error=0.01):
+    ''' Convenience function comparing aggregate_long_draws with
+    method='sketch' to the exact 2.5/97.5 percentiles.
 
     Arguments:
     df : DataFrame
          A pandas DataFrame.
+    id_cols : str or list-like
+              A single column name, or multiple which identify groups.
+    value_col : str
+                A single column name identifying draw values.
+    relative_error : float, default 0.01
+                     Relative accuracy of the sketch.
+
+    Returns:
+    report : DataFrame
+             One row per statistic (lower, upper) with the maximum absolute
+             error, maximum and mean relative error, and the share of groups
+             within relative_error of the exact value.
     '''
-    # Error handling
-    if not isinstance(df, pd.DataFrame):
-        raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id', 'location_id']):
-        raise ValueError('Supplied df does not contain columns for ihme_loc_id or location_id.')
-    if 'location_name' in df.columns:
-        if df['location_name'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['location_name']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['ihme_loc_id','location_id','location_name']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    else:
-        t = pd.merge(df, locs, on='location_id', how='left')
+    if isinstance(id_cols, str):
+        id_cols = [id_cols]
+    id_cols = list(id_cols)
+    approx = aggregate_long_draws(df, id_cols, value_col, method='sketch',
+                                  relative_error=relative_error)
+    g = df.groupby(id_cols)[value_col]
+    exact = pd.concat([g.quantile(0.025).rename('lower'), g.quantile(0.975).rename('upper')], 
+                      axis=1).reset_index()
+    t = exact.merge(approx, on=id_cols, suffixes=('_exact', '_sketch'))
+
+    rows = []
+    for stat in ['lower', 'upper']:
+        e, a = t[stat + '_exact'].to_numpy(), t[stat + '_sketch'].to_numpy()
+        abs_err = np.abs(a - e)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel_err = np.where(e == 0, np.where(abs_err == 0, 0.0, np.inf), abs_err / np.abs(e))
+        rows.append({'stat' : stat, 'groups' : len(t), 'max_abs_error' : abs_err.max(),
+                     'max_rel_error' : rel_err.max(), 'mean_rel_error' : rel_err.mean(),
+                     'share_within_bound' : (rel_err <= relative_error).mean(),
+                     'relative_error' : relative_error})
+    return(pd.DataFrame(rows))
+#-------------------------#
 
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+#----# GBD Location Tools #----# 
+class LocationTree(_HierarchyTree):
+    ''' Compact in-memory index of the location hierarchy, built from
+    location metadata (location_id and parent_id, ordered by sort_order if
+    present). Supports vectorized parent, level and ancestor lookups, O(1)
+    is_descendant and descendant enumeration. A location counts as its own
+    ancestor and descendant.
+
+    Arguments:
+    meta : DataFrame
+           Location metadata, e.g. from get_location_metadata.
+    '''
+    id_col = 'location_id'
+
+@_instrumented
+def get_location_tree(gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Convenience function which returns a LocationTree of the
+    location_set_id=1 hierarchy, cached for the session.
+
+    Arguments:
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    '''
+    return(_get_tree('location', gbd_round_id, decomp_step, release_id))
+
+def _tree_attr(df, tree, on, level, attr, inplace=False):
+    ''' Internal function which adds attr to df as the ancestor of df[on]
+    at level in tree, resolved once per unique key.
+    '''
+    codes, uniques = _key_codes(df[on])
+    # Always float, as in the metadata, so every partition has one dtype
+    values = tree.get_ancestor_at_level(np.asarray(uniques, dtype=np.float64), level).astype(np.float64)
+    values = pd.api.extensions.take(values, codes, allow_fill=True)
+    return(_assign_attr(df, attr, values, inplace))
+
+@_instrumented
+@_lazy_frames
+def add_ihme_loc_id(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                    inplace=False):
+    ''' Convenience function which returns DataFrame with ihme_loc_id column.
+
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_ihme_loc_id', gbd_round_id, decomp_step, release_id, normalize, inplace))
+
+@_instrumented
+@_lazy_frames
+def add_location_name(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                      inplace=False):
+    ''' Convenience function which returns a DataFrame with location_name column.
+
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_location_name', gbd_round_id, decomp_step, release_id, normalize, inplace))
 
-def add_region_id(df):
+@_instrumented
+@_lazy_frames
+def add_region_id(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                  inplace=False):
     ''' Convenience function which returns a DataFrame with region_id.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
     '''
-    # Error handling
-    if not isinstance(df, pd.DataFrame):
-        raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id','location_id','location_name','region_name']):
-        raise ValueError('Supplied df does not contain column for ihme_loc_id, location_id, location_name, or region_name.')
-    if 'region_id' in df.columns:
-        if df['region_id'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['region_id']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['ihme_loc_id','location_id','location_name','region_id','region_name']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    elif 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    elif 'location_name' in df.columns:
-        t = pd.merge(df, locs, on='location_name', how='left')
-    else :
-        t = pd.merge(df, locs.drop_duplicates(subset=['region_id', 'region_name']), on='region_name', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+    return(_decorate(df, 'add_region_id', gbd_round_id, decomp_step, release_id, normalize, inplace))
 
-def add_region_name(df):
+@_instrumented
+@_lazy_frames
+def add_region_name(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                    inplace=False):
     ''' Convenience function which returns a DataFrame with region_name column.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
     '''
-    # Error handling
-    if not isinstance(df, pd.DataFrame):
-        raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id','location_id','location_name','region_id']):
-        raise ValueError('Supplied df does not contain column for ihme_loc_id, location_id, location_name, or region_id.')
-    if 'region_name' in df.columns:
-        if df['region_name'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['region_name']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['ihme_loc_id','location_id','location_name','region_id','region_name']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    elif 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    elif 'location_name' in df.columns:
-        t = pd.merge(df, locs, on='location_name', how='left')
-    else :
-        t = pd.merge(df, locs.drop_duplicates(subset=['region_id', 'region_name']), on='region_id', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+    return(_decorate(df, 'add_region_name', gbd_round_id, decomp_step, release_id, normalize, inplace))
 
-def add_super_region_id(df):
+@_instrumented
+@_lazy_frames
+def add_super_region_id(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                        inplace=False):
     ''' Convenience function which returns a DataFrame with super_region_id column.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
     '''
-    # Error handling
-    if not isinstance(df, pd.DataFrame):
-        raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id', 'location_id','location_name',
-                                                'region_id','region_name','super_region_name']):
-        raise ValueError('Supplied df does not contain column for ihme_loc_id, location_id, location_name, region_id, region_name, or super_region_name.')
-    if 'super_region_id' in df.columns:
-        if df['super_region_id'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['super_region_id']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['ihme_loc_id','location_id','location_name','region_id','region_name','super_region_id','super_region_name']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    elif 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    elif 'location_name' in df.columns:
-        t = pd.merge(df, locs, on='location_name', how='left')
-    elif 'region_id' in df.columns:
-        t = pd.merge(df, locs.drop_duplicates(subset=['region_id', 'super_region_id']), on='region_id', how='left')
-    elif 'region_name' in df.columns:
-        t = pd.merge(df, locs.drop_duplicates(subset=['region_name', 'super_region_id']), on='region_name', how='left')
-    else:
-        t = pd.merge(df, locs.drop_duplicates(subset=['super_region_name', 'super_region_id']), on='super_region_name', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+    return(_decorate(df, 'add_super_region_id', gbd_round_id, decomp_step, release_id, normalize, inplace))
 
-def add_super_region_name(df):
+@_instrumented
+@_lazy_frames
+def add_super_region_name(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                          inplace=False):
     ''' Convenience function which returns a DataFrame with super_region_name column.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
     '''
-    # Error handling
-    if not isinstance(df, pd.DataFrame):
-        raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['ihme_loc_id', 'location_id','location_name',
-                                                'region_id','region_name','super_region_id']):
-        raise ValueError('Supplied df does not contain column for ihme_loc_id, location_id, location_name, region_id, region_name, or super_region_id.')
-    if 'super_region_name' in df.columns:
-        if df['super_region_name'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['super_region_name']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['location_id','ihme_loc_id','location_name','region_id','region_name','super_region_id','super_region_name']
-    locs = get_location_metadata(location_set_id=1, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'ihme_loc_id' in df.columns:
-        t = pd.merge(df, locs, on='ihme_loc_id', how='left')
-    elif 'location_id' in df.columns:
-        t = pd.merge(df, locs, on='location_id', how='left')
-    elif 'location_name' in df.columns:
-        t = pd.merge(df, locs, on='location_name', how='left')
-    elif 'region_id' in df.columns:
-        t = pd.merge(df, locs.drop_duplicates(subset=['region_id', 'super_region_name']), on='region_id', how='left')
-    elif 'region_name' in df.columns:
-        t = pd.merge(df, locs.drop_duplicates(subset=['region_name', 'super_region_name']), on='region_name', how='left')
-    else:
-        t = pd.merge(df, locs.drop_duplicates(subset=['super_region_id', 'super_region_name']), on='super_region_id', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+    return(_decorate(df, 'add_super_region_name', gbd_round_id, decomp_step, release_id, normalize, inplace))
 #------------------------------#
 
 #----# GBD Cause Tools #----# 
-def add_cause_id(df):
+class CauseTree(_HierarchyTree):
+    ''' Compact in-memory index of the cause hierarchy, built from cause
+    metadata (cause_id and parent_id, ordered by sort_order if present).
+    Supports vectorized parent, level and ancestor lookups, O(1)
+    is_descendant, descendant enumeration and most detailed and
+    restriction flags (male, female, yll_only, yld_only) where the metadata
+    has them.
+
+    Arguments:
+    meta : DataFrame
+           Cause metadata, e.g. from get_cause_metadata.
+    '''
+    id_col = 'cause_id'
+    flag_cols = ['most_detailed', 'male', 'female', 'yll_only', 'yld_only']
+
+@_instrumented
+def get_cause_tree(gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Convenience function which returns a CauseTree of the
+    cause_set_id=3 hierarchy, cached for the session.
+
+    Arguments:
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    '''
+    return(_get_tree('cause', gbd_round_id, decomp_step, release_id))
+
+@_instrumented
+@_lazy_frames
+def add_cause_id(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                 inplace=False):
     ''' Convenience function which returns DataFrame with cause_id column.
 
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_cause_id', gbd_round_id, decomp_step, release_id, normalize, inplace))
+
+@_instrumented
+@_lazy_frames
+def add_acause(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+               inplace=False):
+    ''' Convenience function which returns DataFrame wich acause column.
+
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_acause', gbd_round_id, decomp_step, release_id, normalize, inplace))
+
+@_instrumented
+@_lazy_frames
+def add_cause_name(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                   inplace=False):
+    ''' Convenience function which returns DataFrame with cause_name column.
+
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_cause_name', gbd_round_id, decomp_step, release_id, normalize, inplace))
+
+@_instrumented
+@_lazy_frames
+def add_cause_lancet_label(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                           inplace=False):
+    ''' Convenience function which returns a DataFrame with lancet_label column.
+
+    Arguments:
+    df : DataFrame
+         A pandas DataFrame, a dask DataFrame or an iterator of DataFrame
+         chunks (returns the same kind).
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
+    '''
+    return(_decorate(df, 'add_cause_lancet_label', gbd_round_id, decomp_step, release_id, normalize, inplace))
+#---------------------------#
+
+#----# GBD Population Tools #----# 
+# Population per (gbd_round_id, decomp_step, release_id), as a Series indexed
+# by _population_cols. Only id combinations not yet cached are fetched.
+_population_cols = ['location_id', 'age_group_id', 'sex_id', 'year_id']
+_population_cache = {}
+# Local source used instead of db_queries.get_population (see
+# use_population_source)
+_population_source = {'source' : None}
+
+def _fetch_population(ids, round_args):
+    ''' Internal function to pull population for every combination of the
+    supplied ids from the active source.
+    '''
+    source = _population_source['source']
+    if source is None:
+        return(get_population(**ids, **round_args))
+    if callable(source):
+        return(source(**ids, **round_args))
+    mask = np.ones(len(source), dtype=bool)
+    for col, vals in ids.items():
+        mask &= source[col].isin(vals).to_numpy()
+    return(source[mask])
+
+def _get_population(keys, gbd_round_id=None, decomp_step=None, release_id=None):
+    ''' Internal function returning cached population (a Series indexed by
+    location_id, age_group_id, sex_id and year_id) covering the supplied
+    MultiIndex of integer id combinations. Combinations the source has no
+    population for are NaN.
+    '''
+    key = _metadata_key('location', gbd_round_id, decomp_step, release_id)
+    with _metadata_lock:
+        cached = _population_cache.get(key)
+    missing = keys if cached is None else keys[~keys.isin(cached.index)]
+    if len(missing) == 0:
+        _record_cache_hit()
+        return(cached)
+
+    _, gbd_round_id, decomp_step, release_id = key
+    if release_id is not None:
+        round_args = {'release_id' : release_id}
+    else:
+        round_args = {'gbd_round_id' : gbd_round_id, 'decomp_step' : decomp_step}
+    ids = {c : missing.unique(level=i).tolist() for i, c in enumerate(_population_cols)}
+    pop = _fetch_population(ids, round_args)
+    pop = pop.astype({c : 'int64' for c in _population_cols}).set_index(_population_cols)['population']
+    pop = pop[~pop.index.duplicated()].astype(np.float64)
+    # Combinations the source doesn't have are cached as NaN, so they
+    # aren't requested again
+    absent = missing[~missing.isin(pop.index)].set_names(_population_cols)
+    if len(absent) > 0:
+        pop = pd.concat([pop, pd.Series(np.nan, index=absent, name='population')])
+
+    with _metadata_lock:
+        cached = _population_cache.get(key)
+        if cached is not None:
+            pop = pd.concat([cached, pop[~pop.index.isin(cached.index)]])
+        _population_cache[key] = pop
+    return(pop)
+
+def use_population_source(source):
+    ''' Convenience function to look population up from a local source
+    instead of db_queries.get_population (e.g. a saved extract, or a test
+    fixture). Pass None to go back to the database.
+
+    Arguments:
+    source : DataFrame, str or callable
+             A DataFrame, or a CSV, Parquet or Feather filepath, with
+             location_id, age_group_id, sex_id, year_id and population
+             columns; or a function taking get_population's arguments.
+    '''
+    if isinstance(source, str):
+        if os.path.splitext(source)[1].lower() == '.csv':
+            source = pd.read_csv(source)
+        else:
+            source = read_draws(source)
+    if isinstance(source, pd.DataFrame):
+        if any(c not in source.columns for c in _population_cols + ['population']):
+            raise ValueError('Supplied source does not contain columns for {}, and population.'.format(', '.join(_population_cols)))
+    elif source is not None and not callable(source):
+        raise TypeError('Supplied source is not a DataFrame, filepath or function.')
+    with _metadata_lock:
+        _population_source['source'] = source
+        _population_cache.clear()
+
+@_instrumented
+def add_population(df, gbd_round_id=None, decomp_step=None, release_id=None, normalize=False,
+                   inplace=False):
+    ''' Convenience function which returns a DataFrame with population
+    column, looked up by location_id, age_group_id, sex_id and year_id.
+    Population is cached for the session, so repeat calls only fetch id
+    combinations not seen before. Rows without population are left NaN.
+
     Arguments:
     df : DataFrame
          A pandas DataFrame.
+    gbd_round_id : int (optional)
+                   GBD round of the population. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the population. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the population. If supplied, used instead
+                 of gbd_round_id and decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
+    inplace : bool, default False
+              If true, adds the column to df itself rather than returning
+              a new DataFrame.
     '''
     # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['acause', 'cause_name']):
-        raise ValueError('Supplied df does not contain column for acause or cause_name.')
-    if 'cause_id' in df.columns:
-        if df['cause_id'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['cause_id']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['cause_id', 'acause', 'cause_name']
-    causes = get_cause_metadata(cause_set_id=3, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'acause' in df.columns:
-        t = pd.merge(df, causes, on='acause', how='left')
-    else:
-        t = pd.merge(df, causes, on='cause_name', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
+    if any(c not in df.columns.values for c in _population_cols):
+        raise ValueError('Supplied df does not contain columns for location_id, age_group_id, sex_id, and year_id.')
+    if 'population' in df.columns:
+        if df['population'].notnull().all():
+            return(normalize_frame(df, inplace=inplace) if normalize else df)
+    nulls = df[_population_cols].isnull().any()
+    if nulls.any():
+        raise ValueError('Values in {} contain NAs. Please fix.'.format(', '.join(nulls.index[nulls])))
+
+    # Look each unique id combination up once and broadcast back
+    codes, uniques = pd.MultiIndex.from_frame(df[_population_cols].astype('int64')).factorize()
+    pop = _get_population(uniques, gbd_round_id, decomp_step, release_id)
+    values = pd.api.extensions.take(pop.to_numpy(), pop.index.get_indexer(uniques), allow_fill=True)
+    t = _assign_attr(df, 'population', values[codes], inplace)
+
+    if normalize:
+        t = normalize_frame(t, inplace=inplace)
     return(t)
 
-def add_acause(df):
-    ''' Convenience function which returns DataFrame wich acause column.
+def _weighted_collapse(df, group_cols, calc_cols, weights):
+    ''' Internal function for the weighted mean of calc_cols within groups
+    of group_cols: one 2-D multiply, then one grouped sum of the weighted
+    values and weights. Returns the group keys, the weighted means and the
+    summed weights.
+    '''
+    if np.isnan(weights).any():
+        raise ValueError('Supplied weights contain NAs. Please fix.')
+    block = df[calc_cols].to_numpy(dtype=np.float64) * weights[:, None]
+    # Any NA makes its column sum NaN, so the block is only scanned for
+    # the offending columns when one does
+    if np.isnan(block.sum(axis=0)).any():
+        has_na = np.isnan(block).any(axis=0)
+        raise ValueError('Values in {} contain NAs. Please fix.'.format(', '.join(map(str, np.array(calc_cols)[has_na]))))
+    t = pd.DataFrame(block, columns=calc_cols, copy=False)
+    t['_weight_'] = weights
+    t = pd.concat([df[group_cols].reset_index(drop=True), t], axis=1)
+
+    g = t.groupby(group_cols).sum()
+    weight_sums = g.pop('_weight_').to_numpy()
+    means = pd.DataFrame(g.to_numpy() / weight_sums[:, None], columns=calc_cols, copy=False)
+    return(g.index.to_frame(index=False), means, weight_sums)
+
+@_instrumented
+def age_standardize(df, value_cols, weights, age_col='age_group_id', group_cols=None, 
+                    normalize=False):
+    ''' Convenience function which age-standardizes rates (or rate draws)
+    as the weighted mean of value_cols over ages, in one vectorized pass.
+    Weights are rescaled to the ages present in each group. The output
+    age_col is 27, the GBD age-standardized age group.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame of age-specific rates.
+    value_cols : str or list-like
+                 Columns of rates to standardize (e.g. draw columns).
+    weights : dict, Series or DataFrame
+              Standard population weight of each age group: a mapping of
+              age_col values to weights, or a DataFrame with age_col and
+              age_group_weight_value columns (as from get_age_metadata).
+    age_col : str, default 'age_group_id'
+              Column identifying age groups.
+    group_cols : str or list-like (optional)
+                 Columns to standardize within. Defaults to every column
+                 other than value_cols and age_col.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
     '''
+    # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['cause_id', 'cause_name']):
-        raise ValueError('Supplied df missing column for cause_id or cause_name.')
-    if 'acause' in df.columns:
-        if df['acause'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['acause']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['cause_id', 'acause', 'cause_name']
-    causes = get_cause_metadata(cause_set_id=3, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'cause_id' in df.columns:
-        t = pd.merge(df, causes, on='cause_id', how='left')
-    else:
-        t = pd.merge(df, causes, on='cause_name', how='left')
-
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
-
-def add_cause_name(df):
-    ''' Convenience function which returns DataFrame with cause_name column.
+    if isinstance(value_cols, str):
+        value_cols = [value_cols]
+    if isinstance(group_cols, str):
+        group_cols = [group_cols]
+    if any(c not in df.columns for c in list(value_cols) + [age_col]):
+        raise ValueError('One or more supplied value_cols or age_col not found in df columns.')
+    if group_cols is None:
+        group_cols = [c for c in df.columns if c not in list(value_cols) + [age_col]]
+    if any(c not in df.columns for c in group_cols):
+        raise ValueError('One or more supplied group_cols not found in df columns.')
+    if isinstance(weights, pd.DataFrame):
+        if any(c not in weights.columns for c in [age_col, 'age_group_weight_value']):
+            raise ValueError('Supplied weights does not contain columns for {} and age_group_weight_value.'.format(age_col))
+        weights = weights.set_index(age_col)['age_group_weight_value']
+    weights = pd.Series(weights, dtype=np.float64)
+
+    codes, uniques = pd.factorize(df[age_col])
+    pos = weights.index.get_indexer(uniques)
+    if (pos < 0).any():
+        raise ValueError('Supplied weights missing for {} value(s): {}.'.format(age_col, ', '.join(map(str, uniques[pos < 0]))))
+
+    keys, means, _ = _weighted_collapse(df, group_cols, list(value_cols), weights.to_numpy()[pos][codes])
+    keys[age_col] = 27
+    g = pd.concat([keys, means], axis=1)
+    if normalize:
+        g = normalize_frame(g)
+    return(g)
+
+@_instrumented
+def pop_weighted_collapse(df, group_cols, calc_cols=None, pop_col='population', location_level=None,
+                          gbd_round_id=None, decomp_step=None, release_id=None, normalize=False):
+    ''' Convenience function which collapses rates (or rate draws) to the
+    population-weighted mean within groups, optionally aggregating
+    locations up to a level of the location hierarchy. Population is added
+    from the session cache (see add_population) if df lacks pop_col.
 
     Arguments:
     df : DataFrame
-         A pandas DataFrame.
+         A pandas DataFrame of rates.
+    group_cols : str or list-like
+                 Columns to group by.
+    calc_cols : str or list-like (optional)
+                Columns to collapse. Defaults to every column other than
+                group_cols and pop_col.
+    pop_col : str, default 'population'
+              Column of population weights. Summed in the output.
+    location_level : int (optional)
+                     If supplied, location_id (which must be in group_cols)
+                     is replaced by its ancestor at this level first. Rows
+                     for locations above the level are dropped.
+    gbd_round_id : int (optional)
+                   GBD round of the population and location hierarchy.
+                   Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the population and location hierarchy.
+                  Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release. If supplied, used instead of gbd_round_id and
+                 decomp_step.
+    normalize : bool, default False
+                If true, downcasts GBD id columns in the output (see
+                normalize_frame).
     '''
+    # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['cause_id', 'acause']):
-        raise ValueError('Supplied df missing column for cause_id or acause.')
-    if 'cause_name' in df.columns:
-        if df['cause_name'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['cause_name']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['cause_id', 'acause', 'cause_name']
-    causes = get_cause_metadata(cause_set_id=3, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'cause_id' in df.columns:
-        t = pd.merge(df, causes, on='cause_id', how='left')
-    else:
-        t = pd.merge(df, causes, on='acause', how='left')
+    if isinstance(group_cols, str):
+        group_cols = [group_cols]
+    if isinstance(calc_cols, str):
+        calc_cols = [calc_cols]
+    if any(c not in df.columns for c in group_cols):
+        raise ValueError('One or more supplied group_cols not found in df columns.')
+    if calc_cols is None:
+        calc_cols = [c for c in df.columns if c not in group_cols + [pop_col]]
+    if any(c not in df.columns for c in calc_cols):
+        raise ValueError('One or more supplied calc_cols not found in df columns.')
+    if location_level is not None and 'location_id' not in group_cols:
+        raise ValueError('Supplied location_level requires location_id in group_cols.')
+
+    if pop_col not in df.columns:
+        df = add_population(df, gbd_round_id, decomp_step, release_id)
+        df = df.rename(columns={'population' : pop_col}) if pop_col != 'population' else df
+    nulls = df[pop_col].isnull().to_numpy()
+    if nulls.any():
+        id_cols = [c for c in _population_cols if c in df.columns] or group_cols
+        ids = df.loc[nulls, id_cols].drop_duplicates()
+        raise ValueError('Values in {} contain NAs for {} id combination(s) ({}): {}. Please fix.'.format(
+                         pop_col, len(ids), ', '.join(id_cols), ', '.join(map(str, ids.itertuples(index=False, name=None)))[:500]))
+    if location_level is not None:
+        tree = get_location_tree(gbd_round_id, decomp_step, release_id)
+        codes, uniques = pd.factorize(df['location_id'])
+        parents = tree.get_ancestor_at_level(np.asarray(uniques, dtype=np.float64), location_level)[codes]
+        df = df.iloc[np.flatnonzero(~np.isnan(parents))].assign(location_id=parents[~np.isnan(parents)])
+
+    keys, means, pop = _weighted_collapse(df, group_cols, calc_cols, df[pop_col].to_numpy(dtype=np.float64))
+    if location_level is not None:
+        keys['location_id'] = keys['location_id'].astype(np.int64)
+    g = pd.concat([keys, means, pd.Series(pop, name=pop_col)], axis=1)
+    if normalize:
+        g = normalize_frame(g)
+    return(g)
+#--------------------------------#
+
+#----# I/O Helpers #----# 
+def _get_file_format(path, file_format=None):
+    ''' Internal function to determine the columnar format of a draw file
+    from either the supplied file_format or the path's extension.
+    '''
+    if file_format is None:
+        ext = path.lower().rsplit('.', 1)[-1]
+        if ext in ['parquet', 'pq']:
+            file_format = 'parquet'
+        elif ext in ['feather', 'arrow', 'ipc']:
+            file_format = 'feather'
+        else:
+            raise ValueError('Cannot infer file_format from {}. Supply one of: parquet, feather.'.format(path))
+    if file_format not in ['parquet', 'feather']:
+        raise ValueError('Supplied file_format not one of: parquet, feather.')
+    return(file_format)
 
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
+@_instrumented
+def read_draws(path, id_cols=None, draw_col_stub=None, location_id=None, year_id=None, 
+               sex_id=None, memory_map=False, file_format=None):
+    ''' Convenience function to read draw data from a Parquet or Feather file,
+    reading only the columns and rows needed.
 
-def add_cause_lancet_label(df):
-    ''' Convenience function which returns a DataFrame with lancet_label column.
+    Arguments:
+    path : str
+           Filepath to a Parquet (.parquet, .pq) or Feather (.feather, .arrow)
+           file.
+    id_cols : str or list-like (optional)
+              Id columns to read. If neither id_cols nor draw_col_stub is
+              supplied, all columns are read.
+    draw_col_stub : str (optional)
+                    A stub matching each draw column to read.
+    location_id : int or list-like (optional)
+                  Only read rows with these location_ids.
+    year_id : int or list-like (optional)
+              Only read rows with these year_ids.
+    sex_id : int or list-like (optional)
+             Only read rows with these sex_ids.
+    memory_map : bool, default False
+                 If true, memory-maps the file rather than reading it into
+                 memory up front.
+    file_format : str (optional)
+                  One of parquet, feather. Inferred from path if not supplied.
+
+    Returns:
+    df : DataFrame
+         A pandas DataFrame of the requested columns and rows.
+    '''
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    # Error handling
+    if not isinstance(path, str):
+        raise TypeError('Supplied path is not a string.')
+    file_format = _get_file_format(path, file_format)
+    if isinstance(id_cols, str):
+        id_cols = [id_cols]
+
+    # Project only the needed columns
+    if file_format == 'parquet':
+        all_cols = pq.read_schema(path, memory_map=memory_map).names
+    else:
+        # Only the footer is read, not the (compressed) columns
+        with pa.memory_map(path) as source:
+            all_cols = pa.ipc.open_file(source).schema.names
+    columns = None
+    if id_cols is not None or draw_col_stub is not None:
+        columns = list(id_cols) if id_cols is not None else []
+        if draw_col_stub is not None:
+            columns += [c for c in all_cols if draw_col_stub in c and c not in columns]
+
+    # Build the row filters
+    filters = {}
+    for col, vals in [('location_id', location_id), ('year_id', year_id), ('sex_id', sex_id)]:
+        if vals is not None:
+            filters[col] = [vals] if np.isscalar(vals) else list(vals)
+    if columns is not None:
+        if any(c not in all_cols for c in columns + list(filters)):
+            raise ValueError('One or more requested columns not found in {}.'.format(path))
+    elif any(c not in all_cols for c in filters):
+        raise ValueError('One or more filter columns not found in {}.'.format(path))
+
+    # Parquet pushes the filters down to row groups; feather filters after
+    # (memory-mapped) read
+    if file_format == 'parquet':
+        pq_filters = [(col, 'in', vals) for col, vals in filters.items()] or None
+        table = pq.read_table(path, columns=columns, filters=pq_filters, memory_map=memory_map)
+    else:
+        read_cols = None if columns is None else columns + [c for c in filters if c not in columns]
+        table = feather.read_table(path, columns=read_cols, memory_map=memory_map)
+        if filters:
+            expr = None
+            for col, vals in filters.items():
+                e = ds.field(col).isin(vals)
+                expr = e if expr is None else expr & e
+            table = table.filter(expr)
+        if columns is not None:
+            table = table.select(columns)
+
+    return(table.to_pandas())
+
+@_instrumented
+def write_draws(df, path, sort_cols=None, row_group_size=None, compression=None, file_format=None):
+    ''' Convenience function to write draw data to a Parquet or Feather file.
 
     Arguments:
     df : DataFrame
          A pandas DataFrame.
+    path : str
+           Filepath to a Parquet (.parquet, .pq) or Feather (.feather, .arrow)
+           file.
+    sort_cols : str or list-like (optional)
+                Columns to sort by before writing. Sorting by the columns
+                most often filtered on (e.g. location_id, year_id) lets
+                read_draws skip whole row groups.
+    row_group_size : int (optional)
+                     Maximum number of rows per Parquet row group.
+    compression : str (optional)
+                  Compression codec passed to pyarrow (e.g. snappy, zstd, lz4).
+    file_format : str (optional)
+                  One of parquet, feather. Inferred from path if not supplied.
     '''
     # Error handling
     if not isinstance(df, pd.DataFrame):
         raise TypeError('Supplied df is not a pandas DataFrame.')
-    if all(c not in df.columns.values for c in ['cause_id', 'acause', 'cause_name']):
-        raise ValueError('Supplied df is missing column for cause_id, acause, or cause_name.')
-    if 'lancet_label' in df.columns:
-        if df['lancet_label'].notnull().all():
-            return(df)
-
-    ret_cols = list(df.columns) + ['lancet_label']
-    gbd_rid = get_core_ref('gbd_round_id')
-    d_step = get_core_ref('decomp_step')
-    meta_cols = ['cause_id', 'acause', 'cause_name', 'lancet_label']
-    causes = get_cause_metadata(cause_set_id=3, gbd_round_id=gbd_rid, decomp_step=d_step)[meta_cols]
-
-    if 'cause_id' in df.columns:
-        t = pd.merge(df, causes, on='cause_id', how='left')
-    elif 'acause' in df.columns:
-        t = pd.merge(df, causes, on='acause', how='left')
+    if not isinstance(path, str):
+        raise TypeError('Supplied path is not a string.')
+    file_format = _get_file_format(path, file_format)
+    if isinstance(sort_cols, str):
+        sort_cols = [sort_cols]
+    if sort_cols is not None:
+        if any(c not in df.columns for c in sort_cols):
+            raise ValueError('One or more supplied sort_cols not found in df columns.')
+        df = df.sort_values(sort_cols)
+
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False, compression=compression or 'snappy', 
+                      row_group_size=row_group_size)
     else:
-        t = pd.merge(df, causes, on='cause_name', how='left')
+        df.reset_index(drop=True).to_feather(path, compression=compression)
+#-------------------------#
 
-    # Remove any non-required cols
-    t = t[ret_cols]
-    return(t)
-#---------------------------#
+#----# Partition Helpers #----# 
+_partition_exts = {'parquet' : 'parquet', 'pq' : 'parquet', 'feather' : 'feather',
+                   'arrow' : 'feather', 'ipc' : 'feather', 'csv' : 'csv'}
+
+def _decorate_partition(part, decorations, round_args, output_path=None, file_format=None):
+    ''' Internal function which reads one partition (path or DataFrame),
+    applies each decoration in turn and either writes the result to
+    output_path, returning the path, or returns the DataFrame.
+    '''
+    if isinstance(part, str):
+        fmt = _partition_exts[part.lower().rsplit('.', 1)[-1]]
+        df = pd.read_csv(part) if fmt == 'csv' else read_draws(part, file_format=fmt)
+    else:
+        df = part
+    for d in decorations:
+        func = globals()[d] if isinstance(d, str) else d
+        df = func(df, inplace=True, **round_args)
+    if output_path is None:
+        return(df)
+    if file_format == 'csv':
+        df.to_csv(output_path, index=False)
+    else:
+        write_draws(df, output_path, file_format=file_format)
+    return(output_path)
+
+@_instrumented
+def decorate_partitions(partitions, decorations, output_dir=None, file_format=None,
+                        max_workers=None, max_in_flight=None, gbd_round_id=None,
+                        decomp_step=None, release_id=None):
+    ''' Convenience function to apply add_* helpers to partitioned data
+    (e.g. one file per location or year) in a process pool. Metadata is
+    fetched once up front and handed to each worker, and at most
+    max_in_flight partitions are read or held at a time.
+
+    Arguments:
+    partitions : str or list-like
+                 A directory of .parquet, .feather or .csv files, or a list
+                 of such filepaths and/or DataFrames.
+    decorations : str, callable or list-like
+                  Helpers to apply in order, by name (e.g. 'add_location_name')
+                  or as module-level functions taking (df, inplace,
+                  gbd_round_id, decomp_step, release_id).
+    output_dir : str (optional)
+                 Directory to write each decorated partition to (under the
+                 same filename as its input; pass the input directory to
+                 write back in place). If not supplied, the decorated
+                 partitions are concatenated and returned.
+    file_format : str (optional)
+                  One of parquet, feather, csv for written partitions.
+                  Defaults to each input file's format, or parquet for
+                  DataFrames.
+    max_workers : int (optional)
+                  Number of worker processes.
+    max_in_flight : int (optional)
+                    Maximum number of partitions submitted at once. Defaults
+                    to twice the number of workers.
+    gbd_round_id : int (optional)
+                   GBD round of the metadata. Defaults to refs.yaml.
+    decomp_step : str (optional)
+                  Decomp step of the metadata. Defaults to refs.yaml.
+    release_id : int (optional)
+                 GBD release of the metadata. If supplied, used instead of
+                 gbd_round_id and decomp_step.
+
+    Returns:
+    A DataFrame of all decorated partitions, or a list of written filepaths
+    if output_dir is supplied.
+    '''
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    # Error handling
+    if isinstance(partitions, str):
+        if not os.path.isdir(partitions):
+            raise ValueError('Supplied partitions directory {} does not exist.'.format(partitions))
+        partitions = sorted(os.path.join(partitions, f) for f in os.listdir(partitions)
+                            if f.lower().rsplit('.', 1)[-1] in _partition_exts)
+    partitions = list(partitions)
+    if len(partitions) == 0:
+        raise ValueError('No partitions supplied.')
+    for part in partitions:
+        if isinstance(part, str):
+            if part.lower().rsplit('.', 1)[-1] not in _partition_exts:
+                raise ValueError('Cannot infer format of {}. Supply .parquet, .feather or .csv files.'.format(part))
+        elif not isinstance(part, pd.DataFrame):
+            raise TypeError('Supplied partitions must be filepaths or pandas DataFrames.')
+    if isinstance(decorations, str) or callable(decorations):
+        decorations = [decorations]
+    if len(decorations) == 0:
+        raise ValueError('No decorations supplied.')
+    for d in decorations:
+        if isinstance(d, str) and (not d.startswith('add_') or d not in globals()):
+            raise ValueError('Supplied decoration {} is not an add_* helper.'.format(d))
+        elif not isinstance(d, str) and not callable(d):
+            raise TypeError('Supplied decorations must be helper names or functions.')
+    if file_format is not None and file_format not in ['parquet', 'feather', 'csv']:
+        raise ValueError('Supplied file_format not one of: parquet, feather, csv.')
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = 2 * max_workers
+
+    # Fetch metadata once, for only the hierarchies the decorations need
+    kinds = set()
+    for d in decorations:
+        if not isinstance(d, str):
+            kinds.update(['location', 'cause'])
+        else:
+            kinds.add(_decorations[d][0] if d in _decorations else 'location')
+    metadata = {}
+    for kind in sorted(kinds):
+        key = _metadata_key(kind, gbd_round_id, decomp_step, release_id)
+        metadata[key] = _get_metadata(*key)
+    _, gbd_round_id, decomp_step, release_id = key
+    round_args = {'gbd_round_id' : gbd_round_id, 'decomp_step' : decomp_step,
+                  'release_id' : release_id}
+
+    # Work out output paths
+    outputs = [None] * len(partitions)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        for i, part in enumerate(partitions):
+            if isinstance(part, str):
+                name = os.path.basename(part)
+                fmt = file_format or _partition_exts[name.lower().rsplit('.', 1)[-1]]
+                if file_format is not None:
+                    name = '{}.{}'.format(name.rsplit('.', 1)[0], file_format)
+            else:
+                fmt = file_format or 'parquet'
+                name = 'partition_{}.{}'.format(i, fmt)
+            outputs[i] = (os.path.join(output_dir, name), fmt)
+
+    # Keep a bounded number of partitions in flight
+    results = [None] * len(partitions)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_seed_metadata,
+                             initargs=(metadata,)) as pool:
+        pending = {}
+        for i, part in enumerate(partitions):
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    results[pending.pop(f)] = f.result()
+            out_path, fmt = outputs[i] if outputs[i] is not None else (None, None)
+            f = pool.submit(_decorate_partition, part, decorations, round_args, out_path, fmt)
+            pending[f] = i
+        for f in list(pending):
+            results[pending.pop(f)] = f.result()
+
+    if output_dir is not None:
+        return(results)
+    return(pd.concat(results, ignore_index=True))
+#-----------------------------#
 
 #----# QSUB Helpers #----# 
 import subprocess
+@_instrumented
 def launch_qsub(errors_path=roots['h'], output_path=roots['h'], job_name=None, queue='i.q', 
                 cluster_project='ihme_general', num_threads=None, num_gigs=None, runtime=None, 
-                script_path=None, script_language='python', extra_args=None):
+                script_path=None, script_language='python', extra_args=None,
+                args_file=None, dry_run=False):
     ''' Convenience function to launch a qsub on the cluster.
 
     Arguments:
@@ -835,7 +3138,17 @@ def launch_qsub(errors_path=roots['h'], output_path=roots['h'], job_name=None, q
                       A string containing the name of the language
                       of the script to be launched.
     extra_args : list-like
-                 An optional list-like object of extra arguments.
+                 An optional list-like object of extra arguments. Each
+                 element is passed to the script as its own argument.
+    args_file : str (optional)
+                A filepath to write extra_args to as JSON. When supplied,
+                the script receives this path as its only extra argument
+                instead of the full argument list (see read_args_file).
+    dry_run : bool, default False
+              If true, returns the qsub argument list without submitting.
+
+    Raises a RuntimeError if qsub is not installed or exits with a nonzero
+    status, so a failed submission is never mistaken for a launched job.
     '''
     # Validate parameter types
     if not isinstance(errors_path, str):
@@ -887,9 +3200,10 @@ def launch_qsub(errors_path=roots['h'], output_path=roots['h'], job_name=None, q
     if script_language.lower() not in ['r', 'python']:
         raise ValueError('Supplied script language is not one of: r, python')
     if script_language.lower() == 'python':
-        shell = '{}shell_python.sh'.format(code_repo)
+        shell = ['{}shell_python.sh'.format(code_repo)]
     elif script_language.lower() == 'r':
-        shell = '/ihme/singularity-images/rstudio/shells/execRscript.sh -i /ihme/singularity-images/rstudio/ihme_rstudio_4030.img -s'
+        shell = ['/ihme/singularity-images/rstudio/shells/execRscript.sh', 
+                 '-i', '/ihme/singularity-images/rstudio/ihme_rstudio_4030.img', '-s']
 
     if script_path is None:
         raise TypeError('You must supply the path to the script to run.')
@@ -899,25 +3213,61 @@ def launch_qsub(errors_path=roots['h'], output_path=roots['h'], job_name=None, q
     if extra_args is not None:
         if not isinstance(extra_args, list):
             raise TypeError('Supplied extra_args is not a list.')
+        extra_args = [str(a) for a in extra_args]
     else:
-        extra_args = ''
-
-    qsub = ('qsub -e {}errors.txt '.format(errors_path),
-            '-o {}output.txt '.format(output_path),
-            '-N {} '.format(job_name),
-            '-l archive=TRUE -q {} '.format(queue),
-            '-P {} '.format(cluster_project),
-            '-l fthread={} '.format(num_threads),
-            '-l m_mem_free={}G '.format(num_gigs),
-            '-l h_rt={} '.format(runtime),
-            '{} '.format(shell),
-            '{} '.format(script_path),
-            '{}'.format(extra_args)
-    ) 
-
-    qsub = ''.join(qsub)
+        extra_args = []
+
+    if args_file is not None:
+        if not isinstance(args_file, str):
+            raise TypeError('Supplied args_file is not a string.')
+        if not dry_run:
+            with open(args_file, 'w') as file:
+                json.dump(extra_args, file)
+        extra_args = [args_file]
+
+    # Build the argument list (no shell, so paths are passed verbatim)
+    qsub = ['qsub', 
+            '-e', '{}errors.txt'.format(errors_path),
+            '-o', '{}output.txt'.format(output_path),
+            '-N', job_name,
+            '-l', 'archive=TRUE', 
+            '-q', queue,
+            '-P', cluster_project,
+            '-l', 'fthread={}'.format(num_threads),
+            '-l', 'm_mem_free={}G'.format(num_gigs),
+            '-l', 'h_rt={}'.format(runtime)]
+    qsub += shell + [script_path] + extra_args
+
+    if dry_run:
+        return(qsub)
 
     print('  {} job submit using {} gigs, {} threads, and {} runtime.'.format(script_language.upper(), num_gigs, num_threads, runtime))
     
-    subprocess.call(qsub, shell=True)
+    try:
+        status = subprocess.call(qsub)
+    except FileNotFoundError as err:
+        raise RuntimeError('qsub not found on this machine; job {} was not submitted.'.format(job_name)) from err
+    if status != 0:
+        raise RuntimeError('qsub exited with status {}; job {} was not submitted.'.format(status, job_name))
+
+@_instrumented
+def read_args_file(args_file):
+    ''' Convenience function to read extra arguments written by launch_qsub
+    via its args_file option. Meant to be called from the launched script.
+
+    Arguments:
+    args_file : str
+                Filepath passed to the script by launch_qsub.
+
+    Returns:
+    args : list
+           The list of extra arguments as strings.
+    '''
+    if not isinstance(args_file, str):
+        raise TypeError('Supplied args_file is not a string.')
+
+    with open(args_file) as file:
+        args = json.load(file)
+
+    return(args)
 #------------------------# 
\ No newline at end of file
@@ -1,2 +1,2 @@
 #!/usr/bin/env bash
-/ihme/code/central_comp/miniconda/envs/gbd_env/bin/python $@
\ No newline at end of file
+/ihme/code/central_comp/miniconda/envs/gbd_env/bin/python "$@"
\ No newline at end of file